@@ -0,0 +1,78 @@
+"""串行与并行汇总的基准测试
+
+生成一个随机账本（含外币交易），分别以串行和不同进程数生成财务报告，
+校验各路径结果完全一致并输出耗时与加速比。结果不一致时返回非零退出码。
+
+用法: python bench_aggregate.py [--rows N] [--workers 2 4 ...] [--repeat N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from finance_currency import RateTable
+from finance_mange import Transaction, LedgerView
+
+CATEGORIES = {
+    'income': ['工资', '奖金', '投资收益'],
+    'expense': ['餐饮', '交通', '购物', '娱乐', '医疗']
+}
+
+
+def build_ledger(rows: int, seed: int = 0) -> LedgerView:
+    """生成一年内按日期顺序记账的随机账本，约四分之一为外币交易"""
+    rng = random.Random(seed)
+    rates = RateTable()
+    for month in range(1, 13):
+        rates.set_rate('USD', f"2024-{month:02d}-01", 7.1 + month / 100)
+        rates.set_rate('EUR', f"2024-{month:02d}-01", 7.8 + month / 50)
+
+    transactions = []
+    for i in range(rows):
+        t_type = 'income' if rng.random() < 0.2 else 'expense'
+        day = 1 + i * 365 // rows
+        date_str = time.strftime('%Y-%m-%d', time.strptime(f"2024 {day}", '%Y %j'))
+        currency = rng.choice(('CNY', 'CNY', 'CNY', 'USD', 'EUR'))
+        transactions.append(Transaction(round(rng.uniform(1, 2000), 2), rng.choice(CATEGORIES[t_type]),
+                                        f"交易{i}", t_type, date_str, currency))
+    return LedgerView(transactions, cache_size=0, rates=rates)
+
+
+def timed(ledger: LedgerView, workers, repeat: int):
+    """生成 repeat 次全年报告，返回 (最短耗时, 报告字典)"""
+    best = None
+    report = None
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        report = ledger._compute_report('2024-01-01', '2024-12-31', workers, ledger.rates.base)
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return best, report.to_dict()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="串行与并行汇总基准测试")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="账本交易笔数")
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4], help="要测试的进程数")
+    parser.add_argument('--repeat', type=int, default=3, help="每种配置的重复次数，取最短耗时")
+    args = parser.parse_args()
+
+    print(f"生成 {args.rows} 笔交易...（CPU 核数: {os.cpu_count()}）")
+    ledger = build_ledger(args.rows)
+
+    serial_time, expected = timed(ledger, None, args.repeat)
+    print(f"{'串行':<10} {serial_time:>8.3f} s")
+
+    mismatches = 0
+    for workers in args.workers:
+        elapsed, report = timed(ledger, workers, args.repeat)
+        status = '' if report == expected else '  ✗ 结果与串行不一致'
+        mismatches += report != expected
+        print(f"{f'{workers} 进程':<10} {elapsed:>8.3f} s  加速比 {serial_time / elapsed:.2f}x{status}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import csv
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# 账本的记账本位币
+BASE_CURRENCY = 'CNY'
+
+CURRENCY_SYMBOLS = {
+    'CNY': '¥',
+    'USD': '$',
+    'EUR': '€',
+    'GBP': '£',
+    'JPY': 'JP¥',
+    'HKD': 'HK$'
+}
+
+
+class MissingRateError(ValueError):
+    """汇率表中缺少折算所需的汇率"""
+
+
+def currency_symbol(currency: str) -> str:
+    """返回币种符号，未知币种使用币种代码"""
+    return CURRENCY_SYMBOLS.get(currency, f"{currency} ")
+
+
+class RateTable:
+    """按日期索引的本地汇率表
+
+    每个汇率表示 1 单位外币折合多少本位币，查询某日汇率时使用不晚于该日的最近一条。
+    折算到非本位币时，若目标币种在该日之前还没有汇率，则使用其最早的一条。
+    汇率文件为 CSV，列为 date,currency,rate。查询结果按 (币种, 日期, 目标币种) 缓存。
+    version 在每次修改汇率后递增，可用作依赖汇率的缓存结果的键。
+    """
+
+    def __init__(self, base: str = BASE_CURRENCY):
+        self.base = base
+        self._dates: Dict[str, List[str]] = {}  # 币种 -> 升序日期
+        self._rates: Dict[str, List[float]] = {}  # 币种 -> 与日期对应的汇率
+        self._memo: Dict[Tuple[str, str, str], float] = {}
+        self.version = 0
+
+    @classmethod
+    def load(cls, path: str, base: str = BASE_CURRENCY) -> 'RateTable':
+        """从 CSV 文件加载汇率表"""
+        table = cls(base)
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            table.update(csv.DictReader(f))
+        return table
+
+    def save(self, path: str) -> None:
+        """保存汇率表到 CSV 文件"""
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['date', 'currency', 'rate'])
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+    def rows(self) -> Iterator[Dict]:
+        """按币种、日期顺序列出所有汇率，每行为 {'date', 'currency', 'rate'}"""
+        for currency in sorted(self._dates):
+            for date_str, rate in zip(self._dates[currency], self._rates[currency]):
+                yield {'date': date_str, 'currency': currency, 'rate': rate}
+
+    def update(self, rows: Iterable[Dict]) -> None:
+        """批量设置汇率，rows 的格式与 rows() 相同"""
+        for row in rows:
+            self.set_rate(str(row['currency']).strip().upper(), str(row['date']).strip(),
+                          float(row['rate']))
+
+    def set_rate(self, currency: str, date_str: str, rate: float) -> None:
+        """设置某币种自 date_str 起的汇率"""
+        if rate <= 0:
+            raise ValueError("汇率必须大于 0")
+        dates = self._dates.setdefault(currency, [])
+        rates = self._rates.setdefault(currency, [])
+        i = bisect_right(dates, date_str)
+        if i and dates[i - 1] == date_str:
+            rates[i - 1] = rate
+        else:
+            dates.insert(i, date_str)
+            rates.insert(i, rate)
+        self._memo.clear()
+        self.version += 1
+
+    def _to_base(self, currency: str, date_str: str, earliest: bool = False) -> float:
+        """1 单位 currency 在 date_str 折合多少本位币，earliest 为真时早于首条汇率的日期使用首条汇率"""
+        if currency == self.base:
+            return 1.0
+        dates = self._dates.get(currency)
+        if not dates:
+            raise MissingRateError(f"缺少 {currency} 的汇率")
+        i = bisect_right(dates, date_str)
+        if not i:
+            if not earliest:
+                raise MissingRateError(f"缺少 {currency} 在 {date_str} 之前的汇率")
+            i = 1
+        return self._rates[currency][i - 1]
+
+    def rate(self, currency: str, date_str: str, target: str = None) -> float:
+        """1 单位 currency 在 date_str 折合多少 target（默认本位币）"""
+        target = target or self.base
+        if currency == target:
+            return 1.0
+        key = (currency, date_str, target)
+        rate = self._memo.get(key)
+        if rate is None:
+            rate = self._to_base(currency, date_str) / self._to_base(target, date_str, earliest=True)
+            self._memo[key] = rate
+        return rate
+
+    def supports(self, currency: str) -> bool:
+        """汇率表能否折算到该币种"""
+        return currency == self.base or currency in self._dates
+
+    def has_rate(self, currency: str, date_str: str) -> bool:
+        """是否能查询到 currency 在 date_str 的汇率"""
+        if currency == self.base:
+            return True
+        dates = self._dates.get(currency)
+        return bool(dates) and dates[0] <= date_str
+
+    def convert_cents(self, groups: Dict[Tuple[str, str], int], target: str = None) -> int:
+        """批量折算：groups 为 (币种, 日期) -> 金额（分），返回折合 target 的总额（分）
+
+        同一币种同一天的金额先合计再折算，每组只查询一次汇率。
+        """
+        return sum(round(cents * self.rate(currency, date_str, target))
+                   for (currency, date_str), cents in groups.items())
+
+    @property
+    def currencies(self) -> List[str]:
+        return [self.base] + sorted(self._dates)
@@ -0,0 +1,327 @@
+import argparse
+import io
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib import error, request
+
+from finance_currency import BASE_CURRENCY, currency_symbol
+from finance_mange import FinanceManager
+from finance_report import render_report
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+
+def _tags(params: Dict):
+    """取出请求中的标签列表，标签必须是字符串列表"""
+    tags = params.get('tags')
+    if tags is not None and (not isinstance(tags, list) or
+                             not all(isinstance(tag, str) for tag in tags)):
+        raise ValueError("tags 必须是字符串列表")
+    return tags
+
+
+class FinanceDaemon:
+    """常驻账本服务
+
+    进程启动时加载一次账本，之后通过本地 HTTP 接口处理记账、查询和报告请求，
+    账本、预算计数和查询缓存在请求之间保持常驻。每个请求都是 POST /<操作>，
+    请求体和响应体均为 JSON。
+    """
+
+    def __init__(self, data_file: str = 'finance_data.json',
+                 host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, rates_file: str = None):
+        self.manager = FinanceManager(data_file, rates_file=rates_file)
+        self.host = host
+        self.port = port
+        self.server = None
+        self.actions: Dict[str, Callable[[Dict], object]] = {
+            'ping': lambda params: {'ledger_version': self.manager.ledger_version},
+            'add': self._add,
+            'add_category': lambda params: self.manager.add_category(params['type'], params['category']),
+            'delete': lambda params: self.manager.delete_transaction(params['id']),
+            'transactions': self._transactions,
+            'balance': lambda params: self.manager.get_balance(params.get('currency')),
+            'summary': lambda params: self.manager.get_monthly_summary(
+                int(params['year']), int(params['month']), params.get('workers'),
+                params.get('currency')),
+            'report': self._report,
+            'statistics': self._statistics,
+            'set_rate': lambda params: self.manager.set_rate(
+                params['currency'], params['date'], float(params['rate'])),
+            'set_budget': self._set_budget,
+            'remove_budget': lambda params: self.manager.remove_budget(
+                params.get('category'), params.get('period', 'month')),
+            'budget': lambda params: self.manager.get_budget_status(
+                params.get('category'), params.get('period', 'month'), params.get('date')),
+            'shutdown': self._shutdown
+        }
+
+    def _add(self, params: Dict) -> bool:
+        return self.manager.add_transaction(
+            float(params['amount']), params['category'], params.get('description', ''),
+            params['type'], params.get('date'), params.get('currency') or BASE_CURRENCY,
+            _tags(params))
+
+    def _transactions(self, params: Dict):
+        transactions = self.manager.get_transactions(
+            params.get('start_date'), params.get('end_date'),
+            params.get('category'), params.get('type'), _tags(params))
+        limit = params.get('limit')
+        if limit is not None:
+            limit = int(limit)
+            if limit < 0:
+                raise ValueError("limit 不能为负数")
+            # limit 为 0 时不返回任何记录（[-0:] 会返回全部）
+            transactions = transactions[len(transactions) - limit:] if limit else []
+        return [t.to_dict() for t in transactions]
+
+    def _statistics(self, params: Dict) -> Optional[Dict]:
+        statistics = self.manager.statistics()
+        return statistics and statistics.summary()
+
+    def _set_budget(self, params: Dict) -> Optional[Dict]:
+        thresholds = params.get('thresholds') or (0.8, 1.0)
+        budget = self.manager.set_budget(params.get('category'), float(params['limit']),
+                                         params.get('period', 'month'),
+                                         tuple(float(ratio) for ratio in thresholds))
+        return budget and budget.to_dict()
+
+    def _report(self, params: Dict):
+        report = self.manager.build_report(params.get('start_date'), params.get('end_date'),
+                                           params.get('workers'), params.get('currency'))
+        if report is None:
+            return None
+        fmt = params.get('fmt')
+        if fmt is None:
+            return report.to_dict()
+        return render_report(report, fmt, io.StringIO())
+
+    def _shutdown(self, params: Dict) -> bool:
+        # shutdown() 会等待 serve_forever 退出，必须在其他线程中调用
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+        return True
+
+    def check_request(self, content_type: Optional[str], origin: Optional[str]) -> Optional[Tuple[int, str]]:
+        """检查请求头，拒绝时返回 (状态码, 错误信息)
+
+        只接受 application/json 请求体：浏览器跨站提交表单或 text/plain 请求时无法设置该类型，
+        跨站 fetch 设置该类型时会先发送服务不支持的 OPTIONS 预检。带有其他站点 Origin 的请求一律拒绝，
+        避免用户访问的网页通过本地端口修改账本或停止服务。
+        """
+        if (content_type or '').split(';')[0].strip().lower() != 'application/json':
+            return 415, "请求的 Content-Type 必须是 application/json"
+        allowed = {f"http://{host}:{self.port}" for host in (self.host, '127.0.0.1', 'localhost')}
+        if origin is not None and origin not in allowed:
+            return 403, f"拒绝来自 {origin} 的请求"
+        return None
+
+    def handle(self, action: str, params: Dict) -> Dict:
+        """执行一个操作，返回响应字典"""
+        handler = self.actions.get(action)
+        if handler is None:
+            return {'ok': False, 'error': f"未知操作: {action}"}
+        # HTTPServer 逐个处理请求，账本无需加锁
+        try:
+            return {'ok': True, 'result': handler(params)}
+        except (KeyError, ValueError, TypeError) as e:
+            return {'ok': False, 'error': f"参数错误: {e}"}
+
+    def serve_forever(self) -> None:
+        """启动服务并阻塞直到收到 shutdown 请求"""
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                data = self.rfile.read(length)
+                status = 400
+                rejected = daemon.check_request(self.headers.get('Content-Type'),
+                                                self.headers.get('Origin'))
+                if rejected:
+                    status, message = rejected
+                    response = {'ok': False, 'error': message}
+                else:
+                    try:
+                        params = json.loads(data or b'{}')
+                        if isinstance(params, dict):
+                            response = daemon.handle(self.path.strip('/'), params)
+                        else:
+                            response = {'ok': False, 'error': "请求体必须是 JSON 对象"}
+                    except json.JSONDecodeError as e:
+                        response = {'ok': False, 'error': f"请求不是有效的 JSON: {e}"}
+
+                body = json.dumps(response, ensure_ascii=False).encode('utf-8')
+                self.send_response(200 if response['ok'] else status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不输出每个请求的访问日志
+
+        self.server = HTTPServer((self.host, self.port), Handler)
+        print(f"财务服务已启动: http://{self.host}:{self.port}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            print("财务服务已停止")
+
+
+def call(action: str, params: Dict = None, host: str = DEFAULT_HOST,
+         port: int = DEFAULT_PORT, timeout: float = 30) -> Dict:
+    """向常驻服务发送一个请求，返回响应字典"""
+    data = json.dumps(params or {}, ensure_ascii=False).encode('utf-8')
+    req = request.Request(f"http://{host}:{port}/{action}", data=data,
+                          headers={'Content-Type': 'application/json'})
+    try:
+        with request.urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read())
+    except error.HTTPError as e:
+        return json.loads(e.read())
+
+
+def main(argv=None):
+    """命令行入口：serve 启动服务，其余子命令作为客户端调用服务"""
+    parser = argparse.ArgumentParser(description="个人财务管理器常驻服务")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve = sub.add_parser('serve', help="启动常驻服务")
+    serve.add_argument('--data-file', default='finance_data.json')
+    serve.add_argument('--rates-file', help="汇率表 CSV 文件（date,currency,rate）")
+
+    add = sub.add_parser('add', help="添加交易记录")
+    add.add_argument('type', choices=['income', 'expense'])
+    add.add_argument('amount', type=float)
+    add.add_argument('category')
+    add.add_argument('description', nargs='?', default='')
+    add.add_argument('--date')
+    add.add_argument('--currency', default=BASE_CURRENCY)
+    add.add_argument('--tag', action='append', dest='tags', help="标签，可重复指定")
+
+    category = sub.add_parser('add-category', help="添加类别，下级类别用 '/' 分隔")
+    category.add_argument('type', choices=['income', 'expense'])
+    category.add_argument('category')
+
+    delete = sub.add_parser('delete', help="删除交易记录")
+    delete.add_argument('id')
+
+    query = sub.add_parser('list', help="查询交易记录")
+    query.add_argument('--start-date')
+    query.add_argument('--end-date')
+    query.add_argument('--category')
+    query.add_argument('--type', choices=['income', 'expense'])
+    query.add_argument('--tag', action='append', dest='tags', help="标签，可重复指定")
+    query.add_argument('--limit', type=int)
+
+    summary = sub.add_parser('summary', help="月度汇总")
+    summary.add_argument('year', type=int)
+    summary.add_argument('month', type=int)
+    summary.add_argument('--currency')
+
+    report = sub.add_parser('report', help="财务报告")
+    report.add_argument('--start-date')
+    report.add_argument('--end-date')
+    report.add_argument('--fmt', default='text', choices=['text', 'json', 'csv', 'html'])
+    report.add_argument('--currency')
+
+    balance = sub.add_parser('balance', help="当前余额")
+    balance.add_argument('--currency')
+    sub.add_parser('statistics', help="支出分位数、滚动日均支出和异常支出")
+
+    set_rate = sub.add_parser('set-rate', help="设置某币种自某日起的汇率（1 单位外币折合多少本位币）")
+    set_rate.add_argument('currency')
+    set_rate.add_argument('rate', type=float)
+    set_rate.add_argument('--date', required=True, help="汇率生效日期")
+
+    set_budget = sub.add_parser('set-budget', help="设置类别预算")
+    set_budget.add_argument('limit', type=float)
+    set_budget.add_argument('--category', help="支出类别，省略时为全部支出的总预算")
+    set_budget.add_argument('--period', default='month', choices=['month', 'year'])
+    set_budget.add_argument('--threshold', type=float, action='append', dest='thresholds',
+                            help="提醒阈值（花费占预算的比例），可重复指定，默认 0.8 和 1.0")
+
+    remove_budget = sub.add_parser('remove-budget', help="删除类别预算")
+    remove_budget.add_argument('--category')
+    remove_budget.add_argument('--period', default='month', choices=['month', 'year'])
+
+    budget = sub.add_parser('budget', help="查询预算使用情况")
+    budget.add_argument('--category')
+    budget.add_argument('--period', default='month', choices=['month', 'year'])
+    budget.add_argument('--date', help="查询该日期所在的预算周期，默认今天")
+    sub.add_parser('ping', help="检查服务是否在运行")
+    sub.add_parser('shutdown', help="停止服务")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        FinanceDaemon(args.data_file, args.host, args.port, args.rates_file).serve_forever()
+        return 0
+
+    if args.command == 'add':
+        params = {'type': args.type, 'amount': args.amount, 'category': args.category,
+                  'description': args.description, 'date': args.date, 'currency': args.currency,
+                  'tags': args.tags}
+    elif args.command == 'add-category':
+        params = {'type': args.type, 'category': args.category}
+    elif args.command == 'delete':
+        params = {'id': args.id}
+    elif args.command == 'list':
+        params = {'start_date': args.start_date, 'end_date': args.end_date,
+                  'category': args.category, 'type': args.type, 'tags': args.tags,
+                  'limit': args.limit}
+    elif args.command == 'summary':
+        params = {'year': args.year, 'month': args.month, 'currency': args.currency}
+    elif args.command == 'report':
+        params = {'start_date': args.start_date, 'end_date': args.end_date, 'fmt': args.fmt,
+                  'currency': args.currency}
+    elif args.command == 'balance':
+        params = {'currency': args.currency}
+    elif args.command == 'set-rate':
+        params = {'currency': args.currency, 'rate': args.rate, 'date': args.date}
+    elif args.command == 'set-budget':
+        params = {'category': args.category, 'limit': args.limit, 'period': args.period,
+                  'thresholds': args.thresholds}
+    elif args.command == 'remove-budget':
+        params = {'category': args.category, 'period': args.period}
+    elif args.command == 'budget':
+        params = {'category': args.category, 'period': args.period, 'date': args.date}
+    else:
+        params = {}
+    action = {'list': 'transactions', 'add-category': 'add_category', 'set-rate': 'set_rate',
+              'set-budget': 'set_budget', 'remove-budget': 'remove_budget'}.get(args.command, args.command)
+
+    try:
+        response = call(action, params, args.host, args.port)
+    except error.URLError as e:
+        print(f"无法连接财务服务 {args.host}:{args.port}: {e.reason}")
+        return 1
+
+    if not response['ok']:
+        print(response['error'])
+        return 1
+
+    result = response['result']
+    if action == 'report' and isinstance(result, str):
+        sys.stdout.write(result)
+    elif action == 'transactions':
+        for item in result:
+            sign = '+' if item['type'] == 'income' else '-'
+            symbol = currency_symbol(item.get('currency', BASE_CURRENCY))
+            print(f"{item['date']} | {sign}{symbol}{item['amount']:.2f}"
+                  f" | {item['category']} | {item['description']} | {item['id']}")
+    else:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    # 余额为 0.0 时也算成功，不能用 in (False, None) 判断
+    return 0 if result is not False and result is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+from functools import reduce
+from typing import Dict, Iterable, Iterator, List
+
+# 层级类别的分隔符，例如 '餐饮/外卖'
+CATEGORY_SEPARATOR = '/'
+
+
+def category_ancestors(category: str) -> List[str]:
+    """返回类别自身及其所有上级类别，例如 '餐饮/外卖' -> ['餐饮', '餐饮/外卖']"""
+    parts = category.split(CATEGORY_SEPARATOR)
+    return [CATEGORY_SEPARATOR.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def in_category(category: str, parent: str) -> bool:
+    """category 是否为 parent 或其下级类别"""
+    return category == parent or category.startswith(parent + CATEGORY_SEPARATOR)
+
+
+class BitmapIndex:
+    """交易位图索引
+
+    每个索引键对应一个 Python 整数位图，第 i 位表示账本中第 i 笔交易，
+    多条件查询化为位图的按位与/或运算。类别键包含所有上级类别，
+    因此查询上级类别时一次查表即可覆盖全部下级类别；月份键用于缩小日期区间。
+    """
+
+    def __init__(self):
+        self._bitmaps: Dict[tuple, int] = {}
+        self.size = 0
+
+    @classmethod
+    def build(cls, transactions: Iterable) -> 'BitmapIndex':
+        """为交易序列批量建立索引
+
+        先收集每个键的下标，再在字节数组中置位并一次性转为整数，
+        避免逐笔追加时反复复制大整数。
+        """
+        index = cls()
+        positions: Dict[tuple, List[int]] = {}
+        for position, transaction in enumerate(transactions):
+            for key in cls._keys(transaction):
+                positions.setdefault(key, []).append(position)
+            index.size = position + 1
+
+        for key, items in positions.items():
+            buffer = bytearray((index.size + 7) // 8)
+            for position in items:
+                buffer[position >> 3] |= 1 << (position & 7)
+            index._bitmaps[key] = int.from_bytes(buffer, 'little')
+        return index
+
+    @staticmethod
+    def _keys(transaction) -> List[tuple]:
+        """交易对应的所有索引键"""
+        keys = [('type', transaction.type), ('month', transaction.date[:7])]
+        keys.extend(('category', c) for c in category_ancestors(transaction.category))
+        keys.extend(('tag', tag) for tag in transaction.tags)
+        return keys
+
+    def append(self, transaction) -> None:
+        """为追加到账本末尾的交易建立索引"""
+        bit = 1 << self.size
+        self.size += 1
+        for key in self._keys(transaction):
+            self._bitmaps[key] = self._bitmaps.get(key, 0) | bit
+
+    def get(self, kind: str, value: str) -> int:
+        """某个索引键的位图"""
+        return self._bitmaps.get((kind, value), 0)
+
+    def union(self, kind: str, values: Iterable[str]) -> int:
+        """多个索引键位图的并集"""
+        return reduce(lambda acc, value: acc | self.get(kind, value), values, 0)
+
+    def values(self, kind: str) -> List[str]:
+        """某类索引的所有键值"""
+        return sorted(value for k, value in self._bitmaps if k == kind)
+
+    @staticmethod
+    def positions(bitmap: int) -> Iterator[int]:
+        """按升序产出位图中置位的下标"""
+        # 转为低位在前的二进制串后用 str.find 跳过连续的 0，避免逐位运算大整数
+        bits = bin(bitmap)[:1:-1]
+        position = bits.find('1')
+        while position != -1:
+            yield position
+            position = bits.find('1', position + 1)
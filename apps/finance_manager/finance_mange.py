@@ -1,18 +1,48 @@
+import calendar
+import copy
+import csv
+import gzip
+import io
 import json
-from datetime import datetime, date
-from typing import List, Dict, Optional
+import multiprocessing
+import os
+from collections import OrderedDict
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date, timedelta
+from typing import Callable, List, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+from finance_currency import BASE_CURRENCY, MissingRateError, RateTable, currency_symbol
+from finance_index import CATEGORY_SEPARATOR, BitmapIndex, category_ancestors, in_category
+from finance_report import FinancialReport, render_report
+from finance_stats import LedgerStatistics
+
+# 交易数少于该值时并行的进程开销大于收益，直接走串行路径
+PARALLEL_MIN_TRANSACTIONS = 20000
+
+# 查询结果缓存的默认容量
+RESULT_CACHE_SIZE = 128
+
+# 内置的顶级类别，运行时添加的类别会保存到数据文件
+DEFAULT_CATEGORIES = {
+    'income': ['工资', '奖金', '投资收益', '其他收入'],
+    'expense': ['餐饮', '交通', '购物', '娱乐', '医疗', '教育', '其他支出']
+}
 
 
 class Transaction:
     """交易记录类"""
 
     def __init__(self, amount: float, category: str, description: str,
-                 transaction_type: str, date_str: str = None):
+                 transaction_type: str, date_str: str = None, currency: str = BASE_CURRENCY,
+                 tags: Iterable[str] = None):
         self.amount = abs(amount)  # 金额总是正数
         self.category = category
         self.description = description
         self.type = transaction_type  # 'income' 或 'expense'
         self.date = date_str or datetime.now().strftime('%Y-%m-%d')
+        self.currency = currency
+        self.tags = list(tags or [])
         self.id = self._generate_id()
 
     def _generate_id(self) -> str:
@@ -27,7 +57,9 @@ class Transaction:
             'category': self.category,
             'description': self.description,
             'type': self.type,
-            'date': self.date
+            'date': self.date,
+            'currency': self.currency,
+            'tags': self.tags
         }
 
     @classmethod
@@ -38,32 +70,950 @@ class Transaction:
             category=data['category'],
             description=data['description'],
             transaction_type=data['type'],
-            date_str=data['date']
+            date_str=data['date'],
+            currency=data.get('currency', BASE_CURRENCY),
+            tags=data.get('tags')
         )
         transaction.id = data['id']
         return transaction
 
     def __str__(self) -> str:
         sign = '+' if self.type == 'income' else '-'
-        return f"{self.date} | {sign}¥{self.amount:.2f} | {self.category} | {self.description}"
+        tags = f" | #{' #'.join(self.tags)}" if self.tags else ""
+        return (f"{self.date} | {sign}{currency_symbol(self.currency)}{self.amount:.2f} | "
+                f"{self.category} | {self.description}{tags}")
 
 
-class FinanceManager:
-    """财务管理器"""
+class Budget:
+    """类别预算
 
-    def __init__(self, data_file: str = 'finance_data.json'):
-        self.data_file = data_file
-        self.transactions: List[Transaction] = []
-        self.categories = {
-            'income': ['工资', '奖金', '投资收益', '其他收入'],
-            'expense': ['餐饮', '交通', '购物', '娱乐', '医疗', '教育', '其他支出']
+    category 为 None 时表示所有支出的总预算；period 为 'month' 或 'year'。
+    预算金额以本位币计，外币支出按交易日汇率折算后计入。
+    thresholds 为触发提醒的花费比例，例如 0.8 表示花费达到预算的 80%。
+    """
+
+    PERIODS = {'month': 7, 'year': 4}  # 周期 -> 日期字符串前缀长度
+
+    def __init__(self, category: Optional[str], limit: float, period: str = 'month',
+                 thresholds: Tuple[float, ...] = (0.8, 1.0)):
+        if period not in self.PERIODS:
+            raise ValueError(f"无效的预算周期: {period}。可选周期: {', '.join(self.PERIODS)}")
+        if limit <= 0:
+            raise ValueError("预算金额必须大于 0")
+        self.category = category
+        self.limit = limit
+        self.period = period
+        self.thresholds = tuple(sorted(thresholds))
+        # 预先换算为分，便于与累计花费直接比较
+        self.limit_cents = round(limit * 100)
+        self.threshold_cents = [round(limit * 100 * ratio) for ratio in self.thresholds]
+
+    @property
+    def key(self) -> Tuple[Optional[str], str]:
+        return (self.category, self.period)
+
+    def period_key(self, date_str: str) -> str:
+        """返回日期所属的预算周期，例如 '2025-01' 或 '2025'"""
+        return date_str[:self.PERIODS[self.period]]
+
+    def period_range(self, period_key: str) -> Tuple[str, str]:
+        """预算周期的起止日期，例如 '2025-02' -> ('2025-02-01', '2025-02-28')"""
+        if self.period == 'year':
+            return f"{period_key}-01-01", f"{period_key}-12-31"
+        year, month = map(int, period_key.split('-'))
+        return f"{period_key}-01", f"{period_key}-{calendar.monthrange(year, month)[1]:02d}"
+
+    def covers(self, item) -> bool:
+        """交易或周期性规则是否计入该预算"""
+        return item.type == 'expense' and (self.category is None or
+                                           in_category(item.category, self.category))
+
+    def to_dict(self) -> Dict:
+        """转换为字典"""
+        return {
+            'category': self.category,
+            'limit': self.limit,
+            'period': self.period,
+            'thresholds': list(self.thresholds)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict):
+        """从字典创建对象"""
+        return cls(
+            category=data.get('category'),
+            limit=data['limit'],
+            period=data.get('period', 'month'),
+            thresholds=tuple(data.get('thresholds', (0.8, 1.0)))
+        )
+
+    def __str__(self) -> str:
+        name = self.category or '全部支出'
+        return f"{name} ({'每月' if self.period == 'month' else '每年'}) 预算 ¥{self.limit:.2f}"
+
+
+class RecurringRule:
+    """周期性交易规则（工资、房租、订阅等）
+
+    规则只保存一条记录，查询时按需在请求的日期区间内展开为交易；
+    汇总统计直接按发生次数计算，无需逐笔展开。按月/按年的规则在目标月份
+    天数不足时落在该月最后一天。
+    """
+
+    FREQUENCIES = ('daily', 'weekly', 'monthly', 'yearly')
+    FREQUENCY_NAMES = {'daily': '天', 'weekly': '周', 'monthly': '月', 'yearly': '年'}
+
+    def __init__(self, amount: float, category: str, description: str,
+                 transaction_type: str, start_date: str, frequency: str = 'monthly',
+                 end_date: str = None, currency: str = BASE_CURRENCY):
+        if frequency not in self.FREQUENCIES:
+            raise ValueError(f"无效的周期: {frequency}。可选周期: {', '.join(self.FREQUENCIES)}")
+        self.amount = abs(amount)
+        self.category = category
+        self.description = description
+        self.type = transaction_type
+        self.frequency = frequency
+        self.currency = currency
+        self.start = _parse_date(start_date)
+        self.end = _parse_date(end_date) if end_date else None
+        self.id = f"rule_{self.start.isoformat()}_{hash(description) % 10000:04d}"
+
+    @property
+    def start_date(self) -> str:
+        return self.start.isoformat()
+
+    @property
+    def end_date(self) -> Optional[str]:
+        return self.end and self.end.isoformat()
+
+    def _nth(self, k: int) -> date:
+        """第 k 次（从 0 开始）发生的日期"""
+        if self.frequency == 'daily':
+            return self.start + timedelta(days=k)
+        if self.frequency == 'weekly':
+            return self.start + timedelta(weeks=k)
+        months = k if self.frequency == 'monthly' else k * 12
+        index = self.start.year * 12 + self.start.month - 1 + months
+        year, month = divmod(index, 12)
+        day = min(self.start.day, calendar.monthrange(year, month + 1)[1])
+        return date(year, month + 1, day)
+
+    def _first_index_on_or_after(self, day: date) -> int:
+        """最早不早于 day 的发生序号"""
+        if day <= self.start:
+            return 0
+        if self.frequency in ('daily', 'weekly'):
+            step = 1 if self.frequency == 'daily' else 7
+            return -(-(day - self.start).days // step)
+        months = (day.year - self.start.year) * 12 + day.month - self.start.month
+        k = months if self.frequency == 'monthly' else months // 12
+        # 估算值至多偏小一次
+        return k if self._nth(k) >= day else k + 1
+
+    def _index_range(self, start_date: Optional[str], end_date: str) -> range:
+        """区间 [start_date, end_date] 内的发生序号"""
+        lo = max(self.start, _parse_date(start_date)) if start_date else self.start
+        hi = _parse_date(end_date)
+        if self.end and self.end < hi:
+            hi = self.end
+        if hi < lo:
+            return range(0)
+        return range(self._first_index_on_or_after(lo),
+                     self._first_index_on_or_after(hi + timedelta(days=1)))
+
+    def occurrences(self, start_date: Optional[str], end_date: str) -> Iterator[str]:
+        """逐个产出区间内的发生日期"""
+        for k in self._index_range(start_date, end_date):
+            yield self._nth(k).isoformat()
+
+    def count(self, start_date: Optional[str], end_date: str) -> int:
+        """区间内的发生次数，按算术直接计算"""
+        return len(self._index_range(start_date, end_date))
+
+    def first_occurrence(self, start_date: Optional[str], end_date: str) -> Optional[str]:
+        """区间内第一次发生的日期"""
+        return next(self.occurrences(start_date, end_date), None)
+
+    def to_transaction(self, date_str: str) -> Transaction:
+        """把某一次发生展开为交易记录"""
+        transaction = Transaction(self.amount, self.category, self.description, self.type,
+                                  date_str, self.currency)
+        transaction.id = f"{self.id}_{date_str}"
+        return transaction
+
+    def to_dict(self) -> Dict:
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'amount': self.amount,
+            'category': self.category,
+            'description': self.description,
+            'type': self.type,
+            'frequency': self.frequency,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'currency': self.currency
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict):
+        """从字典创建对象"""
+        rule = cls(
+            amount=data['amount'],
+            category=data['category'],
+            description=data['description'],
+            transaction_type=data['type'],
+            start_date=data['start_date'],
+            frequency=data['frequency'],
+            end_date=data.get('end_date'),
+            currency=data.get('currency', BASE_CURRENCY)
+        )
+        rule.id = data['id']
+        return rule
+
+    def __str__(self) -> str:
+        sign = '+' if self.type == 'income' else '-'
+        until = f" 至 {self.end_date}" if self.end else ""
+        return (f"{self.start_date}{until} 每{self.FREQUENCY_NAMES[self.frequency]} | "
+                f"{sign}{currency_symbol(self.currency)}{self.amount:.2f} | "
+                f"{self.category} | {self.description}")
+
+
+def _parse_date(date_str: str) -> date:
+    """解析 YYYY-MM-DD 格式的日期"""
+    try:
+        return date.fromisoformat(date_str)
+    except ValueError:
+        raise ValueError(f"无效的日期: {date_str}，应为 YYYY-MM-DD 格式")
+
+
+def _today() -> str:
+    """今天的日期字符串"""
+    return datetime.now().strftime('%Y-%m-%d')
+
+
+def _aggregate_range(transactions: List[Transaction], start: int, stop: int,
+                     start_date: Optional[str], end_date: Optional[str],
+                     target: str = BASE_CURRENCY) -> Dict:
+    """汇总 transactions[start:stop] 中日期位于 [start_date, end_date] 的交易，返回可合并的部分结果
+
+    金额按分累加为整数；外币交易按 (类型, 类别, 币种, 日期) 分组，保留原币种合计与
+    组内最大单笔，由 _finish_aggregate 在合并后每组折算一次，循环中不查询汇率。
+    因此无论如何切分，合并后的结果都与串行结果完全一致。
+    """
+    income_cents = 0
+    expense_cents = 0
+    income_by_category = {}
+    expense_by_category = {}
+    foreign = {}  # (类型, 类别, 币种, 日期) -> [金额（分）, 最大单笔原币种金额, 其序号]
+    max_income = None  # (target 币种金额, 序号)
+    max_expense = None
+    count = 0
+    low = start_date or ''
+    high = end_date or '\uffff'
+
+    for index in range(start, stop):
+        t = transactions[index]
+        date_str = t.date
+        if not low <= date_str <= high:
+            continue
+        count += 1
+        t_type = t.type
+        amount = t.amount
+        currency = t.currency
+        if currency == target:
+            cents = round(amount * 100)
+            if t_type == 'income':
+                income_cents += cents
+                income_by_category[t.category] = income_by_category.get(t.category, 0) + cents
+            else:
+                expense_cents += cents
+                expense_by_category[t.category] = expense_by_category.get(t.category, 0) + cents
+        else:
+            key = (t_type, t.category, currency, date_str)
+            group = foreign.get(key)
+            if group is None:
+                foreign[key] = [round(amount * 100), amount, index]
+            else:
+                group[0] += round(amount * 100)
+                # 同组汇率相同，只需记录组内原币种金额最大的一笔
+                if amount > group[1]:
+                    group[1] = amount
+                    group[2] = index
+            continue
+
+        if t_type == 'income':
+            if max_income is None or amount > max_income[0]:
+                max_income = (amount, index)
+        elif max_expense is None or amount > max_expense[0]:
+            max_expense = (amount, index)
+
+    return {
+        'income_cents': income_cents,
+        'expense_cents': expense_cents,
+        'income_by_category': income_by_category,
+        'expense_by_category': expense_by_category,
+        'foreign': foreign,
+        'max_income': max_income,
+        'max_expense': max_expense,
+        'count': count
+    }
+
+
+def _pick_max(a: Optional[Tuple], b: Optional[Tuple]) -> Optional[Tuple]:
+    """合并两个最大单笔候选，金额相同时保留账本中靠前的一笔"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if b[0] > a[0] or (b[0] == a[0] and b[1] < a[1]):
+        return b
+    return a
+
+
+def _merge_aggregates(parts: List[Dict]) -> Dict:
+    """合并多个部分聚合结果"""
+    merged = _aggregate_range([], 0, 0, None, None)
+    foreign = merged['foreign']
+    for part in parts:
+        merged['income_cents'] += part['income_cents']
+        merged['expense_cents'] += part['expense_cents']
+        for key in ('income_by_category', 'expense_by_category'):
+            target = merged[key]
+            for category, cents in part[key].items():
+                target[category] = target.get(category, 0) + cents
+        for key, (cents, amount, index) in part['foreign'].items():
+            group = foreign.get(key)
+            if group is None:
+                foreign[key] = [cents, amount, index]
+                continue
+            group[0] += cents
+            if _pick_max((group[1], group[2]), (amount, index)) == (amount, index):
+                group[1] = amount
+                group[2] = index
+        merged['max_income'] = _pick_max(merged['max_income'], part['max_income'])
+        merged['max_expense'] = _pick_max(merged['max_expense'], part['max_expense'])
+        merged['count'] += part['count']
+    return merged
+
+
+def _finish_aggregate(merged: Dict, rates: RateTable, target: str) -> Dict:
+    """把合并后的外币分组折算为 target，计入合计、类别汇总和最大单笔"""
+    for (t_type, category, currency, date_str), (cents, amount, index) in merged.pop('foreign').items():
+        rate = rates.rate(currency, date_str, target)
+        cents = round(cents * rate)
+        if t_type == 'income':
+            merged['income_cents'] += cents
+            by_category = merged['income_by_category']
+            merged['max_income'] = _pick_max(merged['max_income'], (amount * rate, index))
+        else:
+            merged['expense_cents'] += cents
+            by_category = merged['expense_by_category']
+            merged['max_expense'] = _pick_max(merged['max_expense'], (amount * rate, index))
+        by_category[category] = by_category.get(category, 0) + cents
+    return merged
+
+
+# 并行汇总时子进程通过 fork 继承的交易列表，只需向子进程传递下标区间
+_FORK_STATE: Optional[List[Transaction]] = None
+
+# 不支持 fork 的平台（如 Windows）上逐笔序列化交易的开销超过并行收益，只走串行路径
+_FORK_CONTEXT = (multiprocessing.get_context('fork')
+                 if 'fork' in multiprocessing.get_all_start_methods() else None)
+
+
+def _aggregate_shard(bounds: Tuple) -> Dict:
+    """子进程入口：汇总继承账本中的一个下标区间"""
+    start, stop, start_date, end_date, target = bounds
+    return _aggregate_range(_FORK_STATE, start, stop, start_date, end_date, target)
+
+
+def _parallel_aggregate(transactions: List[Transaction], start_date: Optional[str],
+                        end_date: Optional[str], target: str, workers: int) -> Dict:
+    """把账本按下标等分给进程池汇总并合并各分片结果
+
+    子进程 fork 时继承账本，父进程不逐笔处理或序列化交易，只发送下标区间。
+    """
+    global _FORK_STATE
+    shards = workers * 4
+    step = -(-len(transactions) // shards)
+    bounds = [(i, min(i + step, len(transactions)), start_date, end_date, target)
+              for i in range(0, len(transactions), step)]
+    _FORK_STATE = transactions
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_FORK_CONTEXT) as executor:
+            return _merge_aggregates(list(executor.map(_aggregate_shard, bounds)))
+    finally:
+        _FORK_STATE = None
+
+
+EXPORT_FIELDS = ['id', 'date', 'type', 'category', 'amount', 'description', 'currency', 'tags']
+
+
+def _prepend(first, rest: Iterable) -> Iterator:
+    """在迭代器前插入一个元素"""
+    yield first
+    yield from rest
+
+
+def iter_csv_lines(transactions: Iterable[Transaction]) -> Iterator[str]:
+    """把交易流转换为 CSV 文本行，首行为表头"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in _prepend(EXPORT_FIELDS, ([t.id, t.date, t.type, t.category, t.amount,
+                                         t.description, t.currency, ';'.join(t.tags)]
+                                        for t in transactions)):
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def iter_jsonl_lines(transactions: Iterable[Transaction]) -> Iterator[str]:
+    """把交易流转换为 JSON Lines 文本行"""
+    for t in transactions:
+        yield json.dumps(t.to_dict(), ensure_ascii=False) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': iter_csv_lines,
+    'jsonl': iter_jsonl_lines
+}
+
+
+def _resolve_workers(workers: Optional[int]) -> Optional[int]:
+    """把 workers 参数规范化为进程数，0 表示使用全部 CPU"""
+    if workers == 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+class ResultCache:
+    """有界 LRU 查询结果缓存
+
+    每个条目记录结果所依赖的日期区间，账本变更时只淘汰区间覆盖变更日期的条目。
+    """
+
+    def __init__(self, maxsize: int = RESULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()  # key -> (起始日期, 结束日期, 结果)
+
+    def get(self, key: Tuple, compute: Callable, start_date: str = None, end_date: str = None):
+        """返回缓存结果，未命中时调用 compute 计算并缓存"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry[2]
+
+        value = compute()
+        if self.maxsize > 0:
+            self._entries[key] = (start_date, end_date, value)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, date_str: str = None) -> None:
+        """淘汰依赖 date_str 的条目，date_str 为 None 时清空缓存"""
+        if date_str is None:
+            self._entries.clear()
+            return
+        stale = [key for key, (start, end, _) in self._entries.items()
+                 if (start is None or start <= date_str) and (end is None or date_str <= end)]
+        for key in stale:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class LedgerView:
+    """账本只读查询
+
+    FinanceManager 和 LedgerSnapshot 共用这些查询方法，结果缓存于各自的 ResultCache 中。
+    周期性规则在查询时按区间展开；未指定结束日期时只展开到今天。
+    汇总类查询可通过 currency 指定折算币种，默认为汇率表的本位币。
+    """
+
+    def __init__(self, transactions: List[Transaction], cache_size: int = RESULT_CACHE_SIZE,
+                 recurring_rules: List[RecurringRule] = None, rates: RateTable = None):
+        self.transactions = transactions
+        self.recurring_rules = recurring_rules if recurring_rules is not None else []
+        self.rates = rates or RateTable()
+        self._cache = ResultCache(cache_size)
+        self._statistics: Optional[LedgerStatistics] = None
+        self._statistics_date: Optional[str] = None  # 统计已计入周期性规则发生的截止日期
+        self._index: Optional[BitmapIndex] = None
+
+    def _base_cents(self, transaction: Transaction) -> int:
+        """交易金额折合本位币（分）"""
+        return self.rates.convert_cents({(transaction.currency, transaction.date):
+                                         round(transaction.amount * 100)})
+
+    def statistics(self) -> Optional[LedgerStatistics]:
+        """账本的流式统计（支出分位数、滚动日均支出、类别异常），金额以本位币计
+
+        首次调用时单次遍历账本构建，之后由 add_transaction 增量更新；
+        日期变化后再次调用时补入周期性规则在此期间新到期的发生。
+        汇率表缺少折算所需的汇率时打印错误并返回 None。
+        """
+        today = _today()
+        try:
+            if self._statistics is None:
+                self._statistics = LedgerStatistics.from_transactions(
+                    (t, self._base_cents(t) / 100) for t in self.iter_transactions())
+            elif self._statistics_date < today:
+                start = (_parse_date(self._statistics_date) + timedelta(days=1)).isoformat()
+                for t in self._iter_recurring(start, today, None, None):
+                    self._statistics.add(t, self._base_cents(t) / 100)
+        except MissingRateError as e:
+            self._statistics = None
+            print(f"无法折算金额: {e}")
+            return None
+        self._statistics_date = today
+        return self._statistics
+
+    def index(self) -> BitmapIndex:
+        """交易位图索引，首次使用时建立，之后由 add_transaction 增量维护"""
+        if self._index is None:
+            self._index = BitmapIndex.build(self.transactions)
+        return self._index
+
+    def iter_transactions(self, start_date: str = None, end_date: str = None,
+                          category: str = None, transaction_type: str = None,
+                          tags: Iterable[str] = None) -> Iterator[Transaction]:
+        """逐条产出符合条件的交易记录（含周期性规则展开的交易），不构造中间列表
+
+        category 匹配该类别及其所有下级类别；tags 要求交易包含全部给定标签。
+        """
+        booked = self._iter_booked(start_date, end_date, category, transaction_type, tags)
+        if tags:
+            # 周期性规则没有标签
+            return booked
+        return chain(booked, self._iter_recurring(start_date, end_date, category, transaction_type))
+
+    def _iter_recurring(self, start_date: Optional[str], end_date: Optional[str],
+                        category: Optional[str], transaction_type: Optional[str]) -> Iterator[Transaction]:
+        """按需展开周期性规则在区间内的每次发生"""
+        for rule in self.recurring_rules:
+            if category and not in_category(rule.category, category):
+                continue
+            if transaction_type and rule.type != transaction_type:
+                continue
+            for date_str in rule.occurrences(start_date, end_date or _today()):
+                yield rule.to_transaction(date_str)
+
+    def _iter_booked(self, start_date: Optional[str], end_date: Optional[str],
+                     category: Optional[str], transaction_type: Optional[str],
+                     tags: Iterable[str] = None) -> Iterator[Transaction]:
+        """逐条产出符合条件的已入账交易
+
+        按类别或标签查询时先用位图索引求交集，只检查命中的交易；否则顺序扫描。
+        """
+        if not category and not tags:
+            for t in self.transactions:
+                if start_date and t.date < start_date:
+                    continue
+                if end_date and t.date > end_date:
+                    continue
+                if transaction_type and t.type != transaction_type:
+                    continue
+                yield t
+            return
+
+        index = self.index()
+        bitmap = index.get('category', category) if category else (1 << index.size) - 1
+        for tag in tags or ():
+            bitmap &= index.get('tag', tag)
+        if transaction_type:
+            bitmap &= index.get('type', transaction_type)
+        if bitmap and (start_date or end_date):
+            months = [m for m in index.values('month')
+                      if (not start_date or m >= start_date[:7]) and (not end_date or m <= end_date[:7])]
+            bitmap &= index.union('month', months)
+
+        for position in BitmapIndex.positions(bitmap):
+            t = self.transactions[position]
+            if start_date and t.date < start_date:
+                continue
+            if end_date and t.date > end_date:
+                continue
+            yield t
+
+    def get_transactions(self, start_date: str = None, end_date: str = None,
+                         category: str = None, transaction_type: str = None,
+                         tags: Iterable[str] = None) -> List[Transaction]:
+        """查询交易记录，category 包含下级类别，tags 要求包含全部给定标签"""
+        tags = tuple(sorted(tags)) if tags else None
+        # 未指定结束日期时规则展开到今天，缓存键需包含日期
+        result = self._cache.get(
+            ('get_transactions', start_date, end_date or _today(), category, transaction_type, tags),
+            lambda: list(self.iter_transactions(start_date, end_date, category, transaction_type, tags)),
+            start_date, end_date)
+        # 返回副本，避免调用方修改缓存内容
+        return list(result)
+
+    def export_transactions(self, path: str, fmt: str = None, compress: bool = None,
+                            start_date: str = None, end_date: str = None,
+                            category: str = None, transaction_type: str = None,
+                            tags: Iterable[str] = None) -> int:
+        """将符合条件的交易流式导出为 CSV 或 JSONL 文件，返回导出的条数
+
+        过滤条件与 get_transactions 相同。fmt 为 'csv' 或 'jsonl'，省略时按扩展名推断；
+        compress 省略时以 .gz 结尾的路径自动使用 gzip 压缩。导出过程逐条写入，内存占用恒定。
+        """
+        name = path[:-3] if path.endswith('.gz') else path
+        if compress is None:
+            compress = path.endswith('.gz')
+        if fmt is None:
+            fmt = 'jsonl' if name.endswith(('.jsonl', '.json')) else 'csv'
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}。可选格式: {', '.join(EXPORT_FORMATS)}")
+
+        transactions = self.iter_transactions(start_date, end_date, category, transaction_type, tags)
+        opener = gzip.open if compress else open
+        count = 0
+        with opener(path, 'wt', encoding='utf-8', newline='') as f:
+            for line in EXPORT_FORMATS[fmt](transactions):
+                f.write(line)
+                count += 1
+        # CSV 第一行为表头
+        return count - 1 if fmt == 'csv' else count
+
+    def _target_currency(self, currency: Optional[str]) -> Optional[str]:
+        """规范化汇总使用的币种（默认本位币），汇率表无法折算时打印错误并返回 None"""
+        currency = (currency or self.rates.base).upper()
+        if not self.rates.supports(currency):
+            print(f"不支持的币种: {currency}。可用币种: {', '.join(self.rates.currencies)}")
+            return None
+        return currency
+
+    def get_balance(self, currency: str = None) -> Optional[float]:
+        """获取当前余额，周期性规则计入截至今天的发生，外币按交易日汇率折算
+
+        currency 无法折算或缺少交易日汇率时返回 None。
+        """
+        currency = self._target_currency(currency)
+        if currency is None:
+            return None
+        try:
+            stats = self._aggregate(None, None, recurring_range=(None, _today()), currency=currency)
+        except MissingRateError as e:
+            print(f"无法折算金额: {e}")
+            return None
+        return stats['income_total'] - stats['expense_total']
+
+    def _aggregate(self, start_date: Optional[str], end_date: Optional[str], workers: int = None,
+                   recurring_range: Tuple[Optional[str], str] = None,
+                   currency: str = None) -> Dict:
+        """计算 [start_date, end_date] 内已入账交易的聚合统计，金额折算为 currency（默认本位币）
+
+        workers 大于 1 且交易足够多时，把账本按下标区间切分给进程池并行汇总，
+        再合并各分片的部分结果；结果与串行路径完全一致。
+        recurring_range 为 (起始日期, 结束日期) 时，按发生次数计入周期性规则。
+        """
+        currency = currency or self.rates.base
+        transactions = self.transactions
+        if (workers is None or workers <= 1 or _FORK_CONTEXT is None
+                or len(transactions) < PARALLEL_MIN_TRANSACTIONS):
+            merged = _aggregate_range(transactions, 0, len(transactions), start_date, end_date,
+                                      currency)
+        else:
+            merged = _parallel_aggregate(transactions, start_date, end_date, currency, workers)
+        merged = _finish_aggregate(merged, self.rates, currency)
+
+        # 最大单笔交易：(折算后金额, 交易)
+        max_income = merged['max_income'] and (merged['max_income'][0],
+                                               transactions[merged['max_income'][1]])
+        max_expense = merged['max_expense'] and (merged['max_expense'][0],
+                                                 transactions[merged['max_expense'][1]])
+
+        if recurring_range:
+            for rule in self.recurring_rules:
+                occurrences = rule.count(*recurring_range)
+                if not occurrences:
+                    continue
+
+                if rule.currency == currency:
+                    cents = round(rule.amount * 100) * occurrences
+                    largest = (rule.amount, rule.first_occurrence(*recurring_range))
+                else:
+                    # 外币规则需要逐次按发生日汇率折算
+                    dates = list(rule.occurrences(*recurring_range))
+                    cents = self.rates.convert_cents(
+                        {(rule.currency, d): round(rule.amount * 100) for d in dates}, currency)
+                    largest = max(((rule.amount * self.rates.rate(rule.currency, d, currency), d)
+                                   for d in dates), key=lambda x: x[0])
+
+                key = 'income' if rule.type == 'income' else 'expense'
+                merged[f'{key}_cents'] += cents
+                by_category = merged[f'{key}_by_category']
+                by_category[rule.category] = by_category.get(rule.category, 0) + cents
+                merged['count'] += occurrences
+
+                current = max_income if key == 'income' else max_expense
+                if current is None or largest[0] > current[0]:
+                    current = (largest[0], rule.to_transaction(largest[1]))
+                    if key == 'income':
+                        max_income = current
+                    else:
+                        max_expense = current
+
+        return {
+            'income_total': merged['income_cents'] / 100,
+            'expense_total': merged['expense_cents'] / 100,
+            'income_by_category': {c: v / 100 for c, v in merged['income_by_category'].items()},
+            'expense_by_category': {c: v / 100 for c, v in merged['expense_by_category'].items()},
+            'max_income': max_income and max_income[1],
+            'max_expense': max_expense and max_expense[1],
+            'count': merged['count']
+        }
+
+    def get_monthly_summary(self, year: int, month: int, workers: int = None,
+                            currency: str = None) -> Optional[Dict]:
+        """获取月度汇总，currency 无法折算或缺少交易日汇率时返回 None
+
+        workers 指定并行汇总使用的进程数，默认串行；传入 0 表示使用全部 CPU。
+        """
+        month_str = f"{year:04d}-{month:02d}"
+        currency = self._target_currency(currency)
+        if currency is None:
+            return None
+        # 区间上界 -99 覆盖当月所有日期；汇率变化后版本号不同，不会命中旧结果
+        try:
+            summary = self._cache.get(
+                ('get_monthly_summary', year, month, currency, self.rates.version),
+                lambda: self._compute_monthly_summary(year, month, month_str, workers, currency),
+                f"{month_str}-01", f"{month_str}-99")
+        except MissingRateError as e:
+            print(f"无法折算金额: {e}")
+            return None
+        return dict(summary,
+                    income_by_category=dict(summary['income_by_category']),
+                    expense_by_category=dict(summary['expense_by_category']))
+
+    def _compute_monthly_summary(self, year: int, month: int, month_str: str,
+                                 workers: Optional[int], currency: str) -> Dict:
+        """计算月度汇总（不经过缓存）"""
+        last_day = calendar.monthrange(year, month)[1]
+        month_range = (f"{month_str}-01", f"{month_str}-{last_day:02d}")
+        stats = self._aggregate(*month_range, _resolve_workers(workers), month_range, currency)
+
+        return {
+            'year': year,
+            'month': month,
+            'currency': currency,
+            'income_total': stats['income_total'],
+            'expense_total': stats['expense_total'],
+            'net_income': stats['income_total'] - stats['expense_total'],
+            'income_by_category': stats['income_by_category'],
+            'expense_by_category': stats['expense_by_category'],
+            'transaction_count': stats['count']
         }
+
+    def build_report(self, start_date: str = None, end_date: str = None,
+                     workers: int = None, currency: str = None) -> Optional[FinancialReport]:
+        """构建财务报告对象，期间内没有交易、currency 无法折算或缺少交易日汇率时返回 None
+
+        workers 的含义与 get_monthly_summary 相同，currency 为报告使用的币种。
+        """
+        currency = self._target_currency(currency)
+        if currency is None:
+            return None
+        try:
+            report = self._cached_report(start_date, end_date, workers, currency)
+        except MissingRateError as e:
+            print(f"无法折算金额: {e}")
+            return None
+        # 返回副本，避免调用方修改缓存内容
+        return copy.deepcopy(report)
+
+    def _cached_report(self, start_date: Optional[str], end_date: Optional[str],
+                       workers: Optional[int], currency: str) -> Optional[FinancialReport]:
+        """经过缓存获取财务报告，缺少汇率时抛出 MissingRateError（不写入缓存）"""
+        return self._cache.get(('build_report', start_date, end_date or _today(), currency,
+                                self.rates.version),
+                               lambda: self._compute_report(start_date, end_date, workers, currency),
+                               start_date, end_date)
+
+    def _compute_report(self, start_date: Optional[str], end_date: Optional[str],
+                        workers: Optional[int], currency: str) -> Optional[FinancialReport]:
+        """计算财务报告（不经过缓存）"""
+        stats = self._aggregate(start_date, end_date, _resolve_workers(workers),
+                                (start_date, end_date or _today()), currency)
+        if not stats['count']:
+            return None
+
+        max_income = stats['max_income']
+        max_expense = stats['max_expense']
+        return FinancialReport(
+            start_date=start_date,
+            end_date=end_date,
+            total_income=stats['income_total'],
+            total_expense=stats['expense_total'],
+            transaction_count=stats['count'],
+            income_by_category=stats['income_by_category'],
+            expense_by_category=stats['expense_by_category'],
+            max_income=max_income and max_income.to_dict(),
+            max_expense=max_expense and max_expense.to_dict(),
+            currency=currency
+        )
+
+    def generate_report(self, start_date: str = None, end_date: str = None,
+                        workers: int = None, fmt: str = 'text',
+                        stream: TextIO = None, currency: str = None) -> Optional[FinancialReport]:
+        """生成财务报告并按 fmt 格式（text/json/csv/html）写入 stream
+
+        返回构建好的报告对象，便于缓存或以其他格式再次渲染。
+        """
+        currency = self._target_currency(currency)
+        if currency is None:
+            return None
+
+        try:
+            report = self._cached_report(start_date, end_date, workers, currency)
+        except MissingRateError as e:
+            print(f"无法折算金额: {e}")
+            return None
+        if report is None:
+            print("指定期间内没有交易记录")
+            return None
+
+        render_report(report, fmt, stream)
+        return copy.deepcopy(report)
+
+    def display_transactions(self, limit: int = 10) -> None:
+        """显示最近的交易记录"""
+        if not self.transactions:
+            print("暂无交易记录")
+            return
+
+        print(f"\n 最近 {min(limit, len(self.transactions))} 条交易记录:")
+        print("-" * 70)
+
+        # 按日期排序，最新的在前
+        sorted_transactions = sorted(self.transactions,
+                                    key=lambda x: x.date, reverse=True)
+
+        for transaction in sorted_transactions[:limit]:
+            print(transaction)
+
+
+class LedgerSnapshot(LedgerView):
+    """账本的只读时间点快照，由 FinanceManager.snapshot 创建
+
+    快照与创建它的账本共享交易列表和规则列表，调用方不应修改它们。
+    """
+
+    def __init__(self, transactions: List[Transaction], recurring_rules: List[RecurringRule],
+                 rates: RateTable, version: int):
+        super().__init__(transactions, recurring_rules=recurring_rules, rates=rates)
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.transactions)
+
+
+class FinanceManager(LedgerView):
+    """财务管理器
+
+    汇率表随账本一起保存在数据文件中；指定 rates_file 时，加载后再用该文件中的汇率覆盖。
+    """
+
+    def __init__(self, data_file: str = 'finance_data.json', cache_size: int = RESULT_CACHE_SIZE,
+                 rates_file: str = None):
+        super().__init__([], cache_size)
+        self.data_file = data_file
+        self.rates_file = rates_file
+        self.ledger_version = 0  # 每次账本变更递增
+        self._shared = False  # 交易列表是否被快照共享，共享时修改前需先复制
+        self.budgets: Dict[Tuple[Optional[str], str], Budget] = {}
+        self._budget_spend: Dict[Tuple, int] = {}  # (类别, 周期, 周期键) -> 累计花费（分）
+        self._budget_seeded: set = set()  # 已计入周期性规则的 (类别, 周期, 周期键)
+        self._unpriced_budgets: set = set()  # 缺少汇率、暂时无法计算花费的预算 (类别, 周期)
+        self._budget_callbacks: List[Callable] = []
+        self.categories = {t: list(names) for t, names in DEFAULT_CATEGORIES.items()}
+        # 所有有效类别路径（含下级类别），用于 O(1) 校验
+        self._valid_categories = {t: set(names) for t, names in self.categories.items()}
         self.load_data()
 
+    def add_category(self, transaction_type: str, category: str) -> bool:
+        """添加类别并保存，下级类别用 '/' 分隔，例如 '餐饮/外卖'，上级类别必须已存在"""
+        existed = category in self._valid_categories.get(transaction_type, ())
+        if not self._add_category(transaction_type, category):
+            return False
+        if not existed:
+            self.save_data()
+        return True
+
+    def _add_category(self, transaction_type: str, category: str) -> bool:
+        """登记类别（不保存）"""
+        if transaction_type not in self._valid_categories:
+            print("交易类型必须是 'income' 或 'expense'")
+            return False
+
+        valid = self._valid_categories[transaction_type]
+        parent = category.rpartition(CATEGORY_SEPARATOR)[0]
+        if parent and parent not in valid:
+            print(f"上级类别不存在: {parent}")
+            return False
+
+        if category not in valid:
+            valid.add(category)
+            if not parent:
+                self.categories[transaction_type].append(category)
+        return True
+
+    def _is_valid_category(self, transaction_type: str, category: str) -> bool:
+        return category in self._valid_categories[transaction_type]
+
+    def _register_categories(self, items: Iterable) -> None:
+        """登记已有交易或规则中出现的类别，使重新加载后的下级类别仍可使用"""
+        for item in items:
+            if item.type in self._valid_categories and not self._is_valid_category(item.type, item.category):
+                for path in category_ancestors(item.category):
+                    self._add_category(item.type, path)
+
+    def _custom_categories(self) -> Dict[str, List[str]]:
+        """运行时添加的类别路径（不含内置类别），上级类别排在下级类别之前"""
+        custom = {}
+        for transaction_type, valid in self._valid_categories.items():
+            paths = sorted(valid.difference(DEFAULT_CATEGORIES[transaction_type]))
+            if paths:
+                custom[transaction_type] = paths
+        return custom
+
+    def _check_currency(self, currency: str, date_str: str) -> bool:
+        """检查汇率表能否折算该币种"""
+        if not self.rates.has_rate(currency, date_str):
+            print(f"缺少 {currency} 在 {date_str} 的汇率。可用币种: {', '.join(self.rates.currencies)}")
+            return False
+        return True
+
+    def set_rate(self, currency: str, date_str: str, rate: float) -> bool:
+        """设置某币种自 date_str 起的汇率并保存，缓存的汇总结果、统计和预算花费随之重新计算"""
+        currency = currency.upper()
+        if currency == self.rates.base:
+            print(f"{currency} 是本位币，汇率固定为 1")
+            return False
+        try:
+            _parse_date(date_str)
+            self.rates.set_rate(currency, date_str, rate)
+        except ValueError as e:
+            print(f"设置汇率失败: {e}")
+            return False
+
+        self._ledger_changed()
+        self._rebuild_budgets()
+        print(f"成功设置汇率: 自 {date_str} 起 1 {currency} = {rate} {self.rates.base}")
+        self.save_data()
+        return True
+
     def add_transaction(self, amount: float, category: str, description: str,
-                        transaction_type: str, date_str: str = None) -> bool:
+                        transaction_type: str, date_str: str = None,
+                        currency: str = BASE_CURRENCY, tags: Iterable[str] = None) -> bool:
         """添加交易记录"""
         try:
+            currency = currency.upper()
             # 验证输入
             if amount <= 0:
                 print("金额必须大于 0")
@@ -73,198 +1023,395 @@ class FinanceManager:
                 print("交易类型必须是 'income' 或 'expense'")
                 return False
 
-            if category not in self.categories[transaction_type]:
-                print(f"无效的类别。可选类别: {', '.join(self.categories[transaction_type])}")
+            if not self._is_valid_category(transaction_type, category):
+                print(f"无效的类别。可选类别: {', '.join(sorted(self._valid_categories[transaction_type]))}")
                 return False
 
             # 创建交易记录
-            transaction = Transaction(amount, category, description, transaction_type, date_str)
+            transaction = Transaction(amount, category, description, transaction_type,
+                                      date_str, currency, tags)
+            if not self._check_currency(currency, transaction.date):
+                return False
+
+            self._own_transactions()
             self.transactions.append(transaction)
+            self._ledger_changed(transaction.date, added=transaction)
+            self._update_budgets(transaction, 1)
 
-            print(f"成功添加{'收入' if transaction_type == 'income' else '支出'}记录: ¥{amount:.2f}")
+            print(f"成功添加{'收入' if transaction_type == 'income' else '支出'}记录: "
+                  f"{currency_symbol(currency)}{amount:.2f}")
             self.save_data()
             return True
         except Exception as e:
             print(f"添加交易记录失败: {e}")
             return False
 
-    def get_transactions(self, start_date: str = None, end_date: str = None,
-                         category: str = None, transaction_type: str = None) -> List[Transaction]:
-        """查询交易记录"""
-        filtered_transactions = self.transactions.copy()
+    def set_budget(self, category: Optional[str], limit: float, period: str = 'month',
+                   thresholds: Tuple[float, ...] = (0.8, 1.0)) -> Optional[Budget]:
+        """设置类别预算并保存，category 为 None 表示全部支出，上级类别的预算包含其下级类别
 
-        # 按日期过滤
-        if start_date:
-            filtered_transactions = [t for t in filtered_transactions if t.date >= start_date]
-        if end_date:
-            filtered_transactions = [t for t in filtered_transactions if t.date <= end_date]
+        设置时扫描一次现有支出建立累计花费，之后由 add_transaction/delete_transaction 增量维护。
+        周期性规则按各周期内的发生次数计入，每个周期在首次用到时计算一次。
+        参数无效时打印原因并返回 None；缺少汇率时预算仍会保存，补齐汇率后再计算花费。
+        """
+        if category is not None and not self._is_valid_category('expense', category):
+            print(f"无效的类别。可选类别: {', '.join(sorted(self._valid_categories['expense']))}")
+            return None
 
-        # 按类别过滤
-        if category:
-            filtered_transactions = [t for t in filtered_transactions if t.category == category]
+        try:
+            budget = Budget(category, limit, period, thresholds)
+        except ValueError as e:
+            print(f"设置预算失败: {e}")
+            return None
 
-        # 按类型过滤
-        if transaction_type:
-            filtered_transactions = [t for t in filtered_transactions if t.type == transaction_type]
+        self._drop_budget(category, period)
+        self._install_budget(budget)
+        self.save_data()
+        return budget
 
-        return filtered_transactions
+    def _install_budget(self, budget: Budget) -> None:
+        """登记预算并扫描现有支出建立累计花费，缺少汇率时登记为暂时无法计算"""
+        self.budgets[budget.key] = budget
+        try:
+            for transaction in self.transactions:
+                if budget.covers(transaction):
+                    spend_key = budget.key + (budget.period_key(transaction.date),)
+                    self._budget_spend[spend_key] = \
+                    self._budget_spend.get(spend_key, 0) + self._base_cents(transaction)
+            # 当前周期立即计入周期性规则，之后新增规则时可以触发提醒
+            self._budget_counter(budget, budget.period_key(_today()))
+        except MissingRateError as e:
+            self._mark_unpriced(budget, e)
 
-    def delete_transaction(self, transaction_id: str) -> bool:
-        """删除交易记录"""
-        for i, transaction in enumerate(self.transactions):
-            if transaction.id == transaction_id:
-                deleted = self.transactions.pop(i)
-                print(f"成功删除交易记录: {deleted}")
-                self.save_data()
-                return True
+    def _mark_unpriced(self, budget: Budget, error: MissingRateError) -> None:
+        """缺少汇率时丢弃预算的累计花费，直到 set_rate 补齐汇率后重新计算"""
+        print(f"{budget} 暂时无法计算花费: {error}")
+        self._clear_budget_spend(budget.key)
+        self._unpriced_budgets.add(budget.key)
 
-        print(f"未找到 ID 为 {transaction_id} 的交易记录")
-        return False
+    def _budget_counter(self, budget: Budget, period_key: str) -> int:
+        """预算在某周期的累计花费（分），首次用到该周期时计入周期性规则的发生"""
+        spend_key = budget.key + (period_key,)
+        if spend_key not in self._budget_seeded:
+            self._budget_seeded.add(spend_key)
+            start, end = budget.period_range(period_key)
+            cents = sum(self._rule_cents(rule, start, end)
+                        for rule in self.recurring_rules if budget.covers(rule))
+            if cents:
+                self._budget_spend[spend_key] = self._budget_spend.get(spend_key, 0) + cents
+        return self._budget_spend.get(spend_key, 0)
 
-    def get_balance(self) -> float:
-        """获取当前余额"""
-        total_income = sum(t.amount for t in self.transactions if t.type == 'income')
-        total_expense = sum(t.amount for t in self.transactions if t.type == 'expense')
-        return total_income - total_expense
+    def _rule_cents(self, rule: RecurringRule, start_date: str, end_date: str) -> int:
+        """周期性规则在区间内发生的总金额，折合本位币（分），按发生次数直接计算"""
+        occurrences = rule.count(start_date, end_date)
+        if not occurrences:
+            return 0
+        if rule.currency == self.rates.base:
+            return round(rule.amount * 100) * occurrences
+        return self.rates.convert_cents({(rule.currency, d): round(rule.amount * 100)
+                                         for d in rule.occurrences(start_date, end_date)})
 
-    def get_monthly_summary(self, year: int, month: int) -> Dict:
-        """获取月度汇总"""
-        month_str = f"{year:04d}-{month:02d}"
-        monthly_transactions = [t for t in self.transactions if t.date.startswith(month_str)]
+    def _apply_rule_to_budgets(self, rule: RecurringRule, sign: int) -> None:
+        """在已计算的预算周期中计入（sign=1）或扣除（sign=-1）周期性规则
+
+        未计算的周期在首次用到时会按当前规则列表计算，无需处理。
+        """
+        for spend_key in list(self._budget_seeded):
+            budget = self.budgets[spend_key[:2]]
+            if not budget.covers(rule) or budget.key in self._unpriced_budgets:
+                continue
+            try:
+                cents = self._rule_cents(rule, *budget.period_range(spend_key[2])) * sign
+                if cents:
+                    self._add_budget_spend(budget, spend_key[2], cents)
+            except MissingRateError as e:
+                self._mark_unpriced(budget, e)
 
-        income_total = sum(t.amount for t in monthly_transactions if t.type == 'income')
-        expense_total = sum(t.amount for t in monthly_transactions if t.type == 'expense')
+    def remove_budget(self, category: Optional[str], period: str = 'month') -> bool:
+        """删除类别预算并保存"""
+        if not self._drop_budget(category, period):
+            return False
+        self.save_data()
+        return True
 
-        # 按类别统计
-        income_by_category = {}
-        expense_by_category = {}
+    def _drop_budget(self, category: Optional[str], period: str) -> bool:
+        """移除预算及其累计花费"""
+        if self.budgets.pop((category, period), None) is None:
+            return False
+        self._clear_budget_spend((category, period))
+        self._unpriced_budgets.discard((category, period))
+        return True
 
-        for transaction in monthly_transactions:
-            if transaction.type == 'income':
-                income_by_category[transaction.category] = \
-                income_by_category.get(transaction.category, 0) + transaction.amount
-            else:
-                expense_by_category[transaction.category] = \
-                expense_by_category.get(transaction.category, 0) + transaction.amount
+    def _clear_budget_spend(self, budget_key: Tuple[Optional[str], str]) -> None:
+        """丢弃预算在所有周期的累计花费"""
+        self._budget_spend = {key: cents for key, cents in self._budget_spend.items()
+                              if key[:2] != budget_key}
+        self._budget_seeded = {key for key in self._budget_seeded if key[:2] != budget_key}
+
+    def on_budget_alert(self, callback: Callable[[Budget, str, float, float], None]) -> None:
+        """注册预算提醒回调
+
+        花费向上越过某个阈值时调用 callback(budget, period_key, spent, threshold)。
+        """
+        self._budget_callbacks.append(callback)
 
+    def get_budget_status(self, category: Optional[str], period: str = 'month',
+                          date_str: str = None) -> Optional[Dict]:
+        """查询 date_str（默认今天）所在周期的预算使用情况
+
+        未设置预算或缺少汇率而无法计算花费时返回 None。
+        """
+        budget = self.budgets.get((category, period))
+        if budget is None:
+            return None
+        if budget.key in self._unpriced_budgets:
+            print(f"{budget} 缺少汇率，暂时无法计算花费")
+            return None
+
+        period_key = budget.period_key(date_str or _today())
+        try:
+            spent = self._budget_counter(budget, period_key) / 100
+        except MissingRateError as e:
+            self._mark_unpriced(budget, e)
+            return None
         return {
-            'year': year,
-            'month': month,
-            'income_total': income_total,
-            'expense_total': expense_total,
-            'net_income': income_total - expense_total,
-            'income_by_category': income_by_category,
-            'expense_by_category': expense_by_category,
-            'transaction_count': len(monthly_transactions)
+            'category': category,
+            'period': period,
+            'period_key': period_key,
+            'limit': budget.limit,
+            'spent': spent,
+            'remaining': budget.limit - spent,
+            'ratio': spent / budget.limit
         }
 
-    def generate_report(self, start_date: str = None, end_date: str = None) -> None:
-        """生成财务报告"""
-        transactions = self.get_transactions(start_date, end_date)
+    def _update_budgets(self, transaction: Transaction, sign: int) -> None:
+        """增量更新受交易影响的预算花费，并在越过阈值时触发提醒"""
+        if transaction.type != 'expense' or not self.budgets:
+            return
 
-        if not transactions:
-            print("指定期间内没有交易记录")
+        cents = self._base_cents(transaction) * sign
+        for period in Budget.PERIODS:
+            for category in category_ancestors(transaction.category) + [None]:
+                budget = self.budgets.get((category, period))
+                if budget is None or budget.key in self._unpriced_budgets:
+                    continue
+
+                try:
+                    self._add_budget_spend(budget, budget.period_key(transaction.date), cents)
+                except MissingRateError as e:
+                    self._mark_unpriced(budget, e)
+
+    def _add_budget_spend(self, budget: Budget, period_key: str, cents: int) -> None:
+        """累加预算在某周期的花费，向上越过阈值时触发提醒"""
+        before = self._budget_counter(budget, period_key)
+        after = before + cents
+        self._budget_spend[budget.key + (period_key,)] = after
+
+        for ratio, boundary in zip(budget.thresholds, budget.threshold_cents):
+            if before < boundary <= after:
+                self._fire_budget_alert(budget, period_key, after / 100, ratio)
+
+    def _fire_budget_alert(self, budget: Budget, period_key: str, spent: float,
+                           threshold: float) -> None:
+        """调用预算提醒回调，回调异常不影响记账"""
+        for callback in self._budget_callbacks:
+            try:
+                callback(budget, period_key, spent, threshold)
+            except Exception as e:
+                print(f"预算提醒回调失败: {e}")
+
+    def _rebuild_budgets(self) -> None:
+        """按当前账本重新计算所有预算的累计花费"""
+        budgets = list(self.budgets.values())
+        self.budgets = {}
+        self._budget_spend = {}
+        self._budget_seeded = set()
+        self._unpriced_budgets = set()
+        for budget in budgets:
+            self._install_budget(budget)
+
+    def add_recurring_rule(self, amount: float, category: str, description: str,
+                           transaction_type: str, start_date: str, frequency: str = 'monthly',
+                           end_date: str = None, currency: str = BASE_CURRENCY) -> Optional[RecurringRule]:
+        """添加周期性交易规则，frequency 可选 daily/weekly/monthly/yearly"""
+        try:
+            currency = currency.upper()
+            if amount <= 0:
+                print("金额必须大于 0")
+                return None
+
+            if transaction_type not in ['income', 'expense']:
+                print("交易类型必须是 'income' 或 'expense'")
+                return None
+
+            if not self._is_valid_category(transaction_type, category):
+                print(f"无效的类别。可选类别: {', '.join(sorted(self._valid_categories[transaction_type]))}")
+                return None
+
+            rule = RecurringRule(amount, category, description, transaction_type,
+                                 start_date, frequency, end_date, currency)
+            if not self._check_currency(currency, rule.start_date):
+                return None
+
+            self._own_transactions()
+            self.recurring_rules.append(rule)
+            self._ledger_changed()
+            self._apply_rule_to_budgets(rule, 1)
+
+            print(f"成功添加周期性规则: {rule}")
+            self.save_data()
+            return rule
+        except Exception as e:
+            print(f"添加周期性规则失败: {e}")
+            return None
+
+    def delete_recurring_rule(self, rule_id: str) -> bool:
+        """删除周期性交易规则"""
+        for i, rule in enumerate(self.recurring_rules):
+            if rule.id == rule_id:
+                self._own_transactions()
+                deleted = self.recurring_rules.pop(i)
+                self._ledger_changed()
+                self._apply_rule_to_budgets(deleted, -1)
+                print(f"成功删除周期性规则: {deleted}")
+                self.save_data()
+                return True
+
+        print(f"未找到 ID 为 {rule_id} 的周期性规则")
+        return False
+
+    def snapshot(self) -> 'LedgerSnapshot':
+        """创建当前账本的只读快照，O(1)
+
+        快照与账本共享交易列表，账本下一次修改时才复制（写时复制），
+        之后的修改不会影响快照。快照可用于一致性查询，也可传给 restore 撤销批量导入。
+        """
+        self._shared = True
+        return LedgerSnapshot(self.transactions, self.recurring_rules, self.rates,
+                              self.ledger_version)
+
+    def restore(self, snapshot: 'LedgerSnapshot') -> None:
+        """把账本恢复到快照时的状态并保存"""
+        self.transactions = snapshot.transactions
+        self.recurring_rules = snapshot.recurring_rules
+        self._shared = True
+        self._ledger_changed()
+        self._rebuild_budgets()
+        self.save_data()
+        print(f"已恢复到版本 {snapshot.version}，共 {len(self.transactions)} 条交易记录")
+
+    def _own_transactions(self) -> None:
+        """修改交易或规则列表前调用：若列表被快照共享则先复制一份"""
+        if self._shared:
+            self.transactions = list(self.transactions)
+            self.recurring_rules = list(self.recurring_rules)
+            self._shared = False
+
+    def _ledger_changed(self, date_str: str = None, added: Transaction = None) -> None:
+        """记录账本变更：递增版本号、淘汰受影响的缓存结果并维护流式统计
+
+        新增交易时增量更新统计和位图索引；删除会改变交易位置，且无法从流式统计中撤销，
+        因此其他变更会丢弃二者，在下次使用时重建。
+        """
+        self.ledger_version += 1
+        self._cache.invalidate(date_str)
+        if added is None:
+            self._statistics = None
+            self._index = None
             return
 
-        # 基本统计
-        total_income = sum(t.amount for t in transactions if t.type == 'income')
-        total_expense = sum(t.amount for t in transactions if t.type == 'expense')
-        net_income = total_income - total_expense
-
-        print("\n" + "=" * 50)
-        print("财务报告")
-        print("=" * 50)
-
-        if start_date and end_date:
-            print(f"报告期间: {start_date} 至 {end_date}")
-        elif start_date:
-            print(f"报告期间: {start_date} 至今")
-        elif end_date:
-            print(f"报告期间: 开始 至 {end_date}")
-        else:
-            print("报告期间: 全部记录")
-
-        print(f"\n 基本统计:")
-        print(f" 总收入: ¥{total_income:,.2f}")
-        print(f" 总支出: ¥{total_expense:,.2f}")
-        print(f" 净收入: ¥{net_income:,.2f}")
-        print(f" 交易笔数: {len(transactions)}")
-
-        # 收入分类统计
-        income_by_category = {}
-        expense_by_category = {}
-
-        for transaction in transactions:
-            if transaction.type == 'income':
-                income_by_category[transaction.category] = \
-                income_by_category.get(transaction.category, 0) + transaction.amount
-            else:
-                expense_by_category[transaction.category] = \
-                expense_by_category.get(transaction.category, 0) + transaction.amount
-
-        if income_by_category:
-            print(f"\n 收入分类:")
-            for category, amount in sorted(income_by_category.items(), key=lambda x: x[1], reverse=True):
-                percentage = (amount / total_income) * 100 if total_income > 0 else 0
-                print(f" {category}: ¥{amount:,.2f} ({percentage:.1f}%)")
-
-        if expense_by_category:
-            print(f"\n 支出分类:")
-            for category, amount in sorted(expense_by_category.items(), key=lambda x: x[1], reverse=True):
-                percentage = (amount / total_expense) * 100 if total_expense > 0 else 0
-                print(f" {category}: ¥{amount:,.2f} ({percentage:.1f}%)")
-
-        # 最大单笔交易
-        if transactions:
-            max_income = max([t for t in transactions if t.type == 'income'],
-                            key=lambda x: x.amount, default=None)
-            max_expense = max([t for t in transactions if t.type == 'expense'],
-                            key=lambda x: x.amount, default=None)
-
-        print(f"\n 最大单笔交易:")
-        if max_income:
-            print(f" 最大收入: ¥{max_income.amount:.2f} ({max_income.description})")
-        if max_expense:
-            print(f" 最大支出: ¥{max_expense.amount:.2f} ({max_expense.description})")
+        if self._index is not None:
+            self._index.append(added)
+        if self._statistics is not None:
+            anomaly = self._statistics.add(added, self._base_cents(added) / 100)
+            if anomaly:
+                print(f"异常支出提醒: {added}（z={anomaly['zscore']:.1f}）")
+
+    def delete_transaction(self, transaction_id: str) -> bool:
+        """删除交易记录"""
+        for i, transaction in enumerate(self.transactions):
+            if transaction.id == transaction_id:
+                self._own_transactions()
+                deleted = self.transactions.pop(i)
+                self._ledger_changed(deleted.date)
+                self._update_budgets(deleted, -1)
+                print(f"成功删除交易记录: {deleted}")
+                self.save_data()
+                return True
+
+        print(f"未找到 ID 为 {transaction_id} 的交易记录")
+        return False
 
     def save_data(self) -> None:
-        """保存数据到文件"""
+        """保存数据到文件
+
+        没有周期性规则、预算、汇率和自定义类别时保存为交易列表；否则保存为包含
+        transactions、recurring、budgets、rates 和 categories 的对象。
+        """
         try:
             data = [transaction.to_dict() for transaction in self.transactions]
+            rates = list(self.rates.rows())
+            categories = self._custom_categories()
+            if self.recurring_rules or self.budgets or rates or categories:
+                data = {
+                    'transactions': data,
+                    'recurring': [rule.to_dict() for rule in self.recurring_rules],
+                    'budgets': [budget.to_dict() for budget in self.budgets.values()],
+                    'rates': rates,
+                    'categories': categories
+                }
             with open(self.data_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
         except Exception as e:
             print(f"保存数据失败: {e}")
 
     def load_data(self) -> None:
-        """从文件加载数据"""
+        """从文件加载数据，指定了汇率文件时再用其中的汇率覆盖数据文件中保存的汇率"""
+        self._ledger_changed()
+        self._shared = False
+        self.rates = RateTable()
         try:
             with open(self.data_file, 'r', encoding='utf-8') as f:
                 data = json.load(f)
+                if isinstance(data, dict):
+                    rules = data.get('recurring', [])
+                    budgets = data.get('budgets', [])
+                    rates = data.get('rates', [])
+                    categories = data.get('categories', {})
+                    data = data.get('transactions', [])
+                else:
+                    rules = []
+                    budgets = []
+                    rates = []
+                    categories = {}
+                for transaction_type, paths in categories.items():
+                    for path in paths:
+                        for ancestor in category_ancestors(path):
+                            self._add_category(transaction_type, ancestor)
                 self.transactions = [Transaction.from_dict(item) for item in data]
+                self.recurring_rules = [RecurringRule.from_dict(item) for item in rules]
+                self.budgets = {budget.key: budget for budget in map(Budget.from_dict, budgets)}
+                self.rates.update(rates)
                 print(f"成功加载 {len(self.transactions)} 条交易记录")
+                if self.recurring_rules:
+                    print(f"成功加载 {len(self.recurring_rules)} 条周期性规则")
+                if self.budgets:
+                    print(f"成功加载 {len(self.budgets)} 项预算")
         except FileNotFoundError:
             print("数据文件不存在，将创建新文件")
             self.transactions = []
+            self.recurring_rules = []
+            self.budgets = {}
         except Exception as e:
             print(f"加载数据失败: {e}")
             self.transactions = []
-
-    def display_transactions(self, limit: int = 10) -> None:
-        """显示最近的交易记录"""
-        if not self.transactions:
-            print("暂无交易记录")
-            return
-
-        print(f"\n 最近 {min(limit, len(self.transactions))} 条交易记录:")
-        print("-" * 70)
-
-        # 按日期排序，最新的在前
-        sorted_transactions = sorted(self.transactions,
-                                    key=lambda x: x.date, reverse=True)
-
-        for transaction in sorted_transactions[:limit]:
-            print(transaction)
+            self.recurring_rules = []
+            self.budgets = {}
+            self.rates = RateTable()
+        if self.rates_file:
+            self.rates.update(RateTable.load(self.rates_file).rows())
+        self._register_categories(chain(self.transactions, self.recurring_rules))
+        self._rebuild_budgets()
 
 
 def main():
@@ -0,0 +1,202 @@
+import csv
+import html
+import io
+import json
+import sys
+from typing import Callable, Dict, List, Optional, TextIO
+
+from finance_currency import BASE_CURRENCY, currency_symbol
+
+
+class FinancialReport:
+    """财务报告数据对象，计算一次即可按多种格式渲染
+
+    金额均以 currency 计；最大单笔交易保留原币种金额。
+    """
+
+    def __init__(self, start_date: Optional[str], end_date: Optional[str],
+                 total_income: float, total_expense: float, transaction_count: int,
+                 income_by_category: Dict[str, float], expense_by_category: Dict[str, float],
+                 max_income: Optional[Dict] = None, max_expense: Optional[Dict] = None,
+                 currency: str = BASE_CURRENCY):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.total_income = total_income
+        self.total_expense = total_expense
+        self.net_income = total_income - total_expense
+        self.transaction_count = transaction_count
+        self.income_by_category = self._rank(income_by_category, total_income)
+        self.expense_by_category = self._rank(expense_by_category, total_expense)
+        self.max_income = max_income
+        self.max_expense = max_expense
+        self.currency = currency
+
+    @staticmethod
+    def _rank(by_category: Dict[str, float], total: float) -> List[Dict]:
+        """按金额降序排列类别并计算占比"""
+        return [
+            {
+                'category': category,
+                'amount': amount,
+                'percentage': (amount / total) * 100 if total > 0 else 0
+            }
+            for category, amount in sorted(by_category.items(), key=lambda x: x[1], reverse=True)
+        ]
+
+    @property
+    def symbol(self) -> str:
+        """报告币种的符号"""
+        return currency_symbol(self.currency)
+
+    @property
+    def period(self) -> str:
+        """报告期间描述"""
+        if self.start_date and self.end_date:
+            return f"{self.start_date} 至 {self.end_date}"
+        if self.start_date:
+            return f"{self.start_date} 至今"
+        if self.end_date:
+            return f"开始 至 {self.end_date}"
+        return "全部记录"
+
+    def to_dict(self) -> Dict:
+        """转换为字典"""
+        return {
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'currency': self.currency,
+            'total_income': self.total_income,
+            'total_expense': self.total_expense,
+            'net_income': self.net_income,
+            'transaction_count': self.transaction_count,
+            'income_by_category': self.income_by_category,
+            'expense_by_category': self.expense_by_category,
+            'max_income': self.max_income,
+            'max_expense': self.max_expense
+        }
+
+
+def _format_transaction(item: Dict) -> str:
+    """最大单笔交易的原币种金额与描述"""
+    symbol = currency_symbol(item.get('currency', BASE_CURRENCY))
+    return f"{symbol}{item['amount']:.2f} ({item['description']})"
+
+
+def render_text(report: FinancialReport, out: TextIO) -> None:
+    """渲染为终端文本"""
+    out.write("\n" + "=" * 50 + "\n")
+    out.write("财务报告\n")
+    out.write("=" * 50 + "\n")
+    out.write(f"报告期间: {report.period}\n")
+
+    out.write("\n 基本统计:\n")
+    out.write(f" 总收入: {report.symbol}{report.total_income:,.2f}\n")
+    out.write(f" 总支出: {report.symbol}{report.total_expense:,.2f}\n")
+    out.write(f" 净收入: {report.symbol}{report.net_income:,.2f}\n")
+    out.write(f" 交易笔数: {report.transaction_count}\n")
+
+    if report.income_by_category:
+        out.write("\n 收入分类:\n")
+        for item in report.income_by_category:
+            out.write(f" {item['category']}: {report.symbol}{item['amount']:,.2f} "
+                      f"({item['percentage']:.1f}%)\n")
+
+    if report.expense_by_category:
+        out.write("\n 支出分类:\n")
+        for item in report.expense_by_category:
+            out.write(f" {item['category']}: {report.symbol}{item['amount']:,.2f} "
+                      f"({item['percentage']:.1f}%)\n")
+
+    out.write("\n 最大单笔交易:\n")
+    if report.max_income:
+        out.write(f" 最大收入: {_format_transaction(report.max_income)}\n")
+    if report.max_expense:
+        out.write(f" 最大支出: {_format_transaction(report.max_expense)}\n")
+
+
+def render_json(report: FinancialReport, out: TextIO) -> None:
+    """渲染为 JSON"""
+    json.dump(report.to_dict(), out, ensure_ascii=False, indent=2)
+    out.write("\n")
+
+
+def render_csv(report: FinancialReport, out: TextIO) -> None:
+    """渲染为 CSV，每行一个指标或类别"""
+    writer = csv.writer(out)
+    writer.writerow(['section', 'name', 'amount', 'percentage'])
+    writer.writerow(['summary', 'period', report.period, ''])
+    writer.writerow(['summary', 'currency', report.currency, ''])
+    writer.writerow(['summary', 'total_income', f"{report.total_income:.2f}", ''])
+    writer.writerow(['summary', 'total_expense', f"{report.total_expense:.2f}", ''])
+    writer.writerow(['summary', 'net_income', f"{report.net_income:.2f}", ''])
+    writer.writerow(['summary', 'transaction_count', report.transaction_count, ''])
+    for section, items in (('income', report.income_by_category),
+                           ('expense', report.expense_by_category)):
+        for item in items:
+            writer.writerow([section, item['category'], f"{item['amount']:.2f}",
+                             f"{item['percentage']:.1f}"])
+    for section, item in (('max_income', report.max_income),
+                          ('max_expense', report.max_expense)):
+        if item:
+            writer.writerow([section, item['description'], f"{item['amount']:.2f}",
+                             item.get('currency', BASE_CURRENCY)])
+
+
+def render_html(report: FinancialReport, out: TextIO) -> None:
+    """渲染为 HTML 片段"""
+    esc = html.escape
+    out.write('<div class="finance-report">\n')
+    out.write('<h2>财务报告</h2>\n')
+    out.write(f'<p>报告期间: {esc(report.period)}</p>\n')
+    out.write('<table class="summary">\n')
+    for label, value in (('总收入', f"{report.symbol}{report.total_income:,.2f}"),
+                         ('总支出', f"{report.symbol}{report.total_expense:,.2f}"),
+                         ('净收入', f"{report.symbol}{report.net_income:,.2f}"),
+                         ('交易笔数', str(report.transaction_count))):
+        out.write(f'<tr><th>{label}</th><td>{value}</td></tr>\n')
+    out.write('</table>\n')
+
+    for title, items in (('收入分类', report.income_by_category),
+                         ('支出分类', report.expense_by_category)):
+        if not items:
+            continue
+        out.write(f'<h3>{title}</h3>\n<table class="categories">\n')
+        for item in items:
+            out.write(f"<tr><td>{esc(item['category'])}</td>"
+                      f"<td>{esc(report.symbol)}{item['amount']:,.2f}</td>"
+                      f"<td>{item['percentage']:.1f}%</td></tr>\n")
+        out.write('</table>\n')
+
+    out.write('<h3>最大单笔交易</h3>\n<ul>\n')
+    for label, item in (('最大收入', report.max_income), ('最大支出', report.max_expense)):
+        if item:
+            out.write(f"<li>{label}: {esc(_format_transaction(item))}</li>\n")
+    out.write('</ul>\n</div>\n')
+
+
+RENDERERS: Dict[str, Callable[[FinancialReport, TextIO], None]] = {
+    'text': render_text,
+    'json': render_json,
+    'csv': render_csv,
+    'html': render_html
+}
+
+
+def render_report(report: FinancialReport, fmt: str = 'text', stream: TextIO = None) -> str:
+    """按指定格式渲染报告
+
+    渲染结果先写入内存缓冲区，再一次性写入 stream（默认标准输出），
+    避免逐行输出带来的终端 I/O 开销。返回渲染后的字符串。
+    """
+    if fmt not in RENDERERS:
+        raise ValueError(f"不支持的报告格式: {fmt}。可选格式: {', '.join(RENDERERS)}")
+
+    buffer = io.StringIO()
+    RENDERERS[fmt](report, buffer)
+    content = buffer.getvalue()
+
+    if stream is None:
+        stream = sys.stdout
+    stream.write(content)
+    stream.flush()
+    return content
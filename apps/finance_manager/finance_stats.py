@@ -0,0 +1,212 @@
+import math
+from collections import deque
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 默认统计的支出分位数
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class P2Quantile:
+    """P² 流式分位数估计
+
+    只保存 5 个标记点，每次更新 O(1)，无需保存全部样本。
+    样本少于 5 个时返回精确值。
+    """
+
+    def __init__(self, q: float):
+        if not 0 < q < 1:
+            raise ValueError("分位数必须在 0 和 1 之间")
+        self.q = q
+        self.count = 0
+        self._heights: List[float] = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self._increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, x: float) -> None:
+        """加入一个样本"""
+        self.count += 1
+        h = self._heights
+        if self.count <= 5:
+            h.append(x)
+            h.sort()
+            return
+
+        # 找到 x 所在的区间并更新端点
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if h[i] <= x < h[i + 1])
+
+        n = self._positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # 调整中间三个标记点的高度
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                if h[i - 1] < candidate < h[i + 1]:
+                    h[i] = candidate
+                else:
+                    h[i] = h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        h, n = self._heights, self._positions
+        return h[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+
+    @property
+    def value(self) -> Optional[float]:
+        """当前分位数估计值，没有样本时返回 None"""
+        if not self.count:
+            return None
+        if self.count <= 5:
+            # 样本较少时按最近秩取精确值
+            return self._heights[max(0, math.ceil(self.q * self.count) - 1)]
+        return self._heights[2]
+
+
+class RunningMoments:
+    """Welford 算法在线计算均值和标准差"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def zscore(self, x: float) -> float:
+        std = self.std
+        return (x - self.mean) / std if std > 0 else 0.0
+
+
+class LedgerStatistics:
+    """账本的流式统计：支出分位数、按日滚动平均和类别异常支出
+
+    所有指标都随 add 增量更新，构建时只需遍历账本一次。
+    异常判定使用该笔支出到达之前的类别均值和标准差：样本数不少于
+    min_samples 且 z 分数超过 anomaly_z 时记为异常。
+    """
+
+    def __init__(self, quantiles: Iterable[float] = DEFAULT_QUANTILES,
+                 anomaly_z: float = 3.0, min_samples: int = 5):
+        self.quantiles = {q: P2Quantile(q) for q in quantiles}
+        self.anomaly_z = anomaly_z
+        self.min_samples = min_samples
+        self.category_moments: Dict[str, RunningMoments] = {}
+        self.daily_expense: Dict[str, float] = {}  # 日期 -> 当日支出合计
+        self.anomalies: List[Dict] = []
+        self.expense_count = 0
+        self.last_date: Optional[str] = None
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable[Tuple], **kwargs) -> 'LedgerStatistics':
+        """从 (交易, 本位币金额) 序列单次遍历构建统计"""
+        stats = cls(**kwargs)
+        for transaction, amount in transactions:
+            stats.add(transaction, amount)
+        return stats
+
+    def add(self, transaction, amount: float = None) -> Optional[Dict]:
+        """加入一笔交易，amount 为折算后的金额（默认取交易金额）
+
+        收入不参与支出统计。若该笔支出被判定为异常，返回异常记录。
+        """
+        if transaction.type != 'expense':
+            return None
+        if amount is None:
+            amount = transaction.amount
+
+        self.expense_count += 1
+        for estimator in self.quantiles.values():
+            estimator.add(amount)
+        self.daily_expense[transaction.date] = self.daily_expense.get(transaction.date, 0) + amount
+        if self.last_date is None or transaction.date > self.last_date:
+            self.last_date = transaction.date
+
+        moments = self.category_moments.setdefault(transaction.category, RunningMoments())
+        anomaly = None
+        if moments.count >= self.min_samples:
+            z = moments.zscore(amount)
+            if z > self.anomaly_z:
+                anomaly = {
+                    'id': transaction.id,
+                    'date': transaction.date,
+                    'category': transaction.category,
+                    'amount': amount,
+                    'description': transaction.description,
+                    'zscore': z
+                }
+                self.anomalies.append(anomaly)
+        moments.add(amount)
+        return anomaly
+
+    def percentile(self, q: float) -> Optional[float]:
+        """单笔支出的 q 分位数估计，q 需在构建时指定"""
+        if q not in self.quantiles:
+            raise ValueError(f"未跟踪分位数 {q}。已跟踪: {', '.join(map(str, self.quantiles))}")
+        return self.quantiles[q].value
+
+    @property
+    def median(self) -> Optional[float]:
+        return self.percentile(0.5)
+
+    def rolling_average(self, days: int = 7, end_date: str = None) -> float:
+        """截至 end_date（默认最近一笔支出的日期）的 days 天日均支出"""
+        end_date = end_date or self.last_date
+        if end_date is None:
+            return 0.0
+        end = date.fromisoformat(end_date)
+        total = sum(self.daily_expense.get((end - timedelta(days=i)).isoformat(), 0)
+                    for i in range(days))
+        return total / days
+
+    def iter_rolling_averages(self, days: int = 7) -> Iterator[Tuple[str, float]]:
+        """按日期顺序产出每个有支出日期的 days 天滚动日均支出，滑动窗口单次遍历"""
+        window = deque()
+        total = 0.0
+        for date_str in sorted(self.daily_expense):
+            current = date.fromisoformat(date_str)
+            amount = self.daily_expense[date_str]
+            window.append((current, amount))
+            total += amount
+            while window[0][0] <= current - timedelta(days=days):
+                total -= window.popleft()[1]
+            yield date_str, total / days
+
+    def category_anomalies(self, category: str) -> List[Dict]:
+        """某类别中被判定为异常的支出"""
+        return [item for item in self.anomalies if item['category'] == category]
+
+    def summary(self) -> Dict:
+        """汇总当前统计指标"""
+        return {
+            'expense_count': self.expense_count,
+            'percentiles': {q: estimator.value for q, estimator in self.quantiles.items()},
+            'rolling_7d': self.rolling_average(7),
+            'rolling_30d': self.rolling_average(30),
+            'category_mean': {category: moments.mean
+                              for category, moments in self.category_moments.items()},
+            'anomalies': list(self.anomalies)
+        }
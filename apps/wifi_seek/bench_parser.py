@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""WiFi扫描输出解析的离线校验与基准测试
+
+读取 fixtures 目录中录制的 netsh / iw / iwlist 输出，先与 expected.json 中的
+期望结果比对，再把输出放大若干倍测量解析耗时。无需WiFi硬件，结果不一致时返回非零退出码。
+
+用法: python bench_parser.py [--repeat N] [--scale N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import wifi_parser
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+EXPECTED_FILE = os.path.join(FIXTURES_DIR, "expected.json")
+
+
+def load_fixture(name):
+    """读取录制的输出，.raw 文件按 netsh 的混合编码解码"""
+    path = os.path.join(FIXTURES_DIR, name)
+    with open(path, 'rb') as f:
+        data = f.read()
+    if name.endswith('.raw'):
+        return wifi_parser.decode_mixed_encoding(data)
+    return data.decode('utf-8')
+
+
+def parser_for(name):
+    """根据文件名选择解析函数"""
+    if name.startswith('netsh'):
+        return wifi_parser.parse_netsh
+    if name.startswith('iw_dev'):
+        return wifi_parser.parse_iw_dev
+    return wifi_parser.parse_iwlist
+
+
+def check_fixtures(expected):
+    """逐个比对解析结果，返回不一致的文件名列表"""
+    failures = []
+    for name, want in expected.items():
+        got = parser_for(name)(load_fixture(name))
+        if got != want:
+            failures.append(name)
+            print(f"✗ {name} 解析结果与期望不一致")
+            print(f"  期望: {json.dumps(want, ensure_ascii=False)}")
+            print(f"  实际: {json.dumps(got, ensure_ascii=False)}")
+        else:
+            print(f"✓ {name}: {len(got)} 条")
+    return failures
+
+
+def benchmark(names, repeat, scale):
+    """把每个输出放大 scale 倍后重复解析 repeat 次，打印平均耗时"""
+    print(f"\n基准测试 (放大 {scale} 倍, 重复 {repeat} 次):")
+    for name in names:
+        output = load_fixture(name) * scale
+        parse = parser_for(name)
+        begin = time.perf_counter()
+        for _ in range(repeat):
+            parse(output)
+        elapsed = (time.perf_counter() - begin) / repeat
+        size_kb = len(output.encode('utf-8')) / 1024
+        print(f"{name:<20} {size_kb:>9.1f} KB {elapsed * 1000:>9.3f} ms/次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WiFi扫描输出解析校验与基准测试")
+    parser.add_argument('--repeat', type=int, default=20, help="每个输出的解析次数")
+    parser.add_argument('--scale', type=int, default=200, help="输出放大倍数")
+    args = parser.parse_args()
+
+    with open(EXPECTED_FILE, 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+
+    failures = check_fixtures(expected)
+    benchmark(list(expected), args.repeat, args.scale)
+
+    if failures:
+        print(f"\n{len(failures)} 个输出解析结果不一致")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""WiFi扫描缓存的离线校验
+
+向 WiFiTool 注入返回 fixtures 目录中录制输出的命令执行函数，分别按 Windows（netsh）
+和 Linux（iw / iwlist）流程校验缓存命中、过期重扫、强制刷新、扫描失败不写入缓存
+以及后台刷新（含后台扫描进行中时不阻塞菜单）。无需WiFi硬件，任一检查失败时返回非零退出码。
+
+用法: python check_scan_cache.py
+"""
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+import wifi_parser
+import wifi_seek
+from bench_parser import EXPECTED_FILE, FIXTURES_DIR
+
+# 命令 -> 录制的输出文件
+FIXTURE_FOR_COMMAND = {
+    'netsh': 'netsh_zh.raw',
+    'iw': 'iw_dev.txt',
+    'iwlist': 'iwlist_scan.txt'
+}
+
+
+class CannedRunner:
+    """按命令名返回录制输出的命令执行函数，签名与 subprocess.check_output 相同"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.fail_next = 0  # 接下来的若干次调用抛出超时
+
+    def __call__(self, args, **kwargs):
+        command = args[0]
+        self.calls.append(command)
+        time.sleep(self.delay)
+        if self.fail_next:
+            self.fail_next -= 1
+            raise subprocess.TimeoutExpired(args, kwargs.get('timeout'))
+        with open(os.path.join(FIXTURES_DIR, FIXTURE_FOR_COMMAND[command]), 'rb') as f:
+            return f.read()
+
+
+class Checker:
+    """记录检查结果"""
+
+    def __init__(self):
+        self.failures = 0
+
+    def check(self, name, condition):
+        print(f"{'✓' if condition else '✗'} {name}")
+        if not condition:
+            self.failures += 1
+
+
+def quiet(func, *args, **kwargs):
+    """调用 func 并丢弃其输出的提示信息"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def check_platform(checker, platform, expected):
+    """以指定平台的扫描流程校验缓存行为"""
+    wifi_seek.IS_WINDOWS = platform == 'windows'
+    wifi_seek.IS_LINUX = platform == 'linux'
+    print(f"\n[{platform}]")
+
+    runner = CannedRunner()
+    tool = wifi_seek.WiFiTool(runner=runner, scan_ttl=0.3)
+
+    networks = quiet(tool.get_wifi_networks)
+    checker.check("首次获取时扫描并解析录制输出", networks == expected and len(runner.calls) > 0)
+    scans = len(runner.calls)
+    checker.check("缓存有效期内直接返回缓存", quiet(tool.get_wifi_networks) == expected
+                  and len(runner.calls) == scans)
+
+    quiet(tool.get_wifi_networks, force_refresh=True)
+    checker.check("强制刷新时重新扫描", len(runner.calls) == scans * 2)
+
+    time.sleep(0.35)
+    quiet(tool.get_wifi_networks)
+    checker.check("缓存过期后重新扫描", len(runner.calls) == scans * 3)
+
+    runner.fail_next = 1
+    checker.check("刷新失败时返回空列表", quiet(tool.get_wifi_networks, force_refresh=True) == [])
+    checker.check("刷新失败不覆盖之前的缓存", quiet(tool.get_wifi_networks) == expected)
+
+    tool.invalidate_scan_cache()
+    runner.fail_next = 1
+    quiet(tool.get_wifi_networks)
+    calls = len(runner.calls)
+    checker.check("扫描失败的结果不写入缓存", quiet(tool.get_wifi_networks) == expected
+                  and len(runner.calls) == calls + scans)
+
+    runner = CannedRunner(delay=0.01)
+    tool = wifi_seek.WiFiTool(runner=runner, scan_ttl=1, background_refresh=True)
+    try:
+        time.sleep(0.2)
+        calls = len(runner.calls)
+        networks = quiet(tool.get_wifi_networks)
+        checker.check("后台刷新后菜单直接使用缓存", networks == expected and len(runner.calls) == calls)
+    finally:
+        tool.stop_background_refresh(timeout=2)
+    checker.check("后台刷新线程可以停止", tool._refresh_thread is None)
+
+    # 后台线程至少间隔 1 秒刷新，scan_ttl 更短时下一次扫描开始时缓存已过期
+    runner = CannedRunner(delay=0.3)
+    tool = wifi_seek.WiFiTool(runner=runner, scan_ttl=0.5, background_refresh=True)
+    try:
+        while tool.scan_age() is None:
+            time.sleep(0.01)
+        calls = len(runner.calls)
+        while len(runner.calls) == calls:
+            time.sleep(0.01)
+        begin = time.monotonic()
+        networks = quiet(tool.get_wifi_networks)
+        checker.check("后台扫描进行中时菜单直接返回旧结果",
+                      networks == expected and time.monotonic() - begin < 0.1)
+    finally:
+        tool.stop_background_refresh(timeout=5)
+
+
+def main():
+    with open(EXPECTED_FILE, 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+
+    checker = Checker()
+    check_platform(checker, 'windows', wifi_parser.dedupe_networks(expected['netsh_zh.raw']))
+    check_platform(checker, 'linux', wifi_parser.dedupe_networks(expected['iwlist_scan.txt']))
+
+    if checker.failures:
+        print(f"\n{checker.failures} 项检查失败")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""WiFi扫描输出解析
+
+把 Windows `netsh wlan show network mode=Bssid` 与 Linux `iw dev` / `iwlist <接口> scan`
+的输出解析为网络列表。所有正则在模块加载时预编译，每种输出只遍历一次，
+不依赖任何WiFi硬件，可直接用录制的输出离线测试。
+"""
+import re
+
+# netsh 输出：每行只关心 SSID、信号、身份验证、加密四种字段（兼容中英文系统）
+NETSH_PATTERN = re.compile(
+    r'^[ \t]*(?:'
+    r'SSID (?P<index>\d+) :[ \t]?(?P<ssid>[^\r\n]*)'
+    r'|(?:信号|Signal)[ \t]*:[ \t]*(?P<signal>\d+)%'
+    r'|(?:身份验证|Authentication)[ \t]*:[ \t]*(?P<auth>[^\r\n]*?)'
+    r'|(?:加密|Encryption)[ \t]*:[ \t]*(?P<encryption>[^\r\n]*?)'
+    r')[ \t]*\r?$',
+    re.MULTILINE
+)
+
+# netsh 输出中需要按 UTF-8 修正的 SSID 行
+SSID_LINE_PATTERN = re.compile(r'(SSID \d+ : )(.+)')
+
+# iw dev 输出中的接口名
+INTERFACE_PATTERN = re.compile(r'Interface\s+(\w+)')
+
+# iwlist 输出：一次扫描同时识别小区起点、ESSID、信号和加密相关标记
+IWLIST_PATTERN = re.compile(
+    r'(?P<cell>Cell\s+\d+)'
+    r'|ESSID:"(?P<essid>[^"]*)"'
+    r'|Signal level=(?P<signal>-?\d+)'
+    r'|Encryption key:(?P<key>on|off)'
+    r'|(?P<wpa>WPA)'
+    r'|(?P<wep>WEP)'
+)
+
+
+def decode_mixed_encoding(byte_data):
+    """解码混合编码的 netsh 输出：正文为 GBK，SSID 可能为 UTF-8"""
+    decoded = byte_data.decode('gbk', errors='replace')
+
+    def fix_ssid(match):
+        prefix = match.group(1)
+        ssid_bytes = match.group(2).encode('gbk', errors='replace')
+        try:
+            fixed_ssid = ssid_bytes.decode('utf-8')
+        except UnicodeDecodeError:
+            fixed_ssid = match.group(2)
+        return prefix + fixed_ssid
+
+    return SSID_LINE_PATTERN.sub(fix_ssid, decoded)
+
+
+def parse_netsh(output):
+    """解析 netsh 扫描输出，返回按出现顺序排列的网络列表（未去重）"""
+    networks = []
+    current = None
+
+    for match in NETSH_PATTERN.finditer(output):
+        ssid = match.group('ssid')
+        if ssid is not None:
+            current = {
+                "ssid": ssid.strip().strip('"'),
+                "signal": 0,
+                "authentication": "",
+                "encryption": ""
+            }
+            networks.append(current)
+        elif current is None:
+            continue
+        elif match.group('signal') is not None:
+            # 同一 SSID 下可能有多个 BSSID，取信号最强的一个
+            current["signal"] = max(current["signal"], int(match.group('signal')))
+        elif match.group('auth') is not None:
+            current["authentication"] = match.group('auth')
+        else:
+            current["encryption"] = match.group('encryption')
+
+    # 隐藏网络的 SSID 为空，无法用于连接
+    return [network for network in networks if network["ssid"]]
+
+
+def parse_iw_dev(output):
+    """解析 iw dev 输出，返回WiFi接口名列表"""
+    return INTERFACE_PATTERN.findall(output)
+
+
+def signal_from_dbm(dbm):
+    """把 dBm 转换为百分比（近似值）"""
+    return min(100, max(0, int((dbm + 90) * (100 / 60))))
+
+
+def _finish_cell(cell, networks):
+    """根据小区中收集到的字段生成网络信息"""
+    if cell is None or cell["ssid"] is None:
+        return
+    network = {
+        "ssid": cell["ssid"],
+        "signal": signal_from_dbm(cell["dbm"]) if cell["dbm"] is not None else 0
+    }
+    if cell["key"]:
+        if cell["wpa"]:
+            network["authentication"] = "WPA/WPA2"
+            network["encryption"] = "CCMP/AES"
+        elif cell["wep"]:
+            network["authentication"] = "WEP"
+            network["encryption"] = "WEP"
+        else:
+            network["authentication"] = "Unknown"
+            network["encryption"] = "Unknown"
+    else:
+        network["authentication"] = "Open"
+        network["encryption"] = "None"
+    networks.append(network)
+
+
+def parse_iwlist(output):
+    """解析 iwlist scan 输出，返回按出现顺序排列的网络列表（未去重）"""
+    networks = []
+    cell = None
+
+    for match in IWLIST_PATTERN.finditer(output):
+        kind = match.lastgroup
+        if kind == 'cell':
+            _finish_cell(cell, networks)
+            cell = {"ssid": None, "dbm": None, "key": False, "wpa": False, "wep": False}
+        elif cell is None:
+            continue
+        elif kind == 'essid':
+            if cell["ssid"] is None:
+                cell["ssid"] = match.group('essid')
+        elif kind == 'signal':
+            if cell["dbm"] is None:
+                cell["dbm"] = int(match.group('signal'))
+        elif kind == 'key':
+            cell["key"] = cell["key"] or match.group('key') == 'on'
+        else:
+            cell[kind] = True
+
+    _finish_cell(cell, networks)
+    return networks
+
+
+def dedupe_networks(networks):
+    """按 SSID 去重（保留信号最强的一条），并按信号强度降序排列"""
+    unique_networks = {}
+    for network in networks:
+        ssid = network["ssid"]
+        if ssid not in unique_networks or network["signal"] > unique_networks[ssid]["signal"]:
+            unique_networks[ssid] = network
+    return sorted(unique_networks.values(), key=lambda x: x["signal"], reverse=True)
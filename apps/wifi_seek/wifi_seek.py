@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
+import argparse
 import subprocess
-import re
 import os
 import time
 import json
@@ -12,6 +12,8 @@ from datetime import datetime
 import pywifi
 from pywifi import const
 
+import wifi_parser
+
 # 检测操作系统
 IS_WINDOWS = os.name == 'nt'
 IS_LINUX = not IS_WINDOWS and os.path.exists('/etc/linux-release') or os.path.exists('/proc/version')
@@ -22,12 +24,30 @@ CONFIG_DIR = os.path.join(SCRIPT_DIR, "config")
 PASSWORD_FILE = os.path.join(CONFIG_DIR, "password.txt")
 SUCCESSFUL_CONNECTIONS_FILE = os.path.join(CONFIG_DIR, "successful_connections.json")
 
+# 扫描结果缓存的有效期（秒）
+DEFAULT_SCAN_TTL = 30
+
 
 class WiFiTool:
-    def __init__(self):
-        """初始化WiFi工具"""
+    def __init__(self, runner=None, scan_ttl=DEFAULT_SCAN_TTL, background_refresh=False):
+        """初始化WiFi工具
+
+        runner: 执行系统命令的函数，签名与 subprocess.check_output 相同，可替换为返回录制输出的函数以便离线测试
+        scan_ttl: 扫描结果缓存的有效期（秒），期内的菜单操作直接使用缓存
+        background_refresh: 是否启动后台线程按 scan_ttl 周期刷新扫描结果
+        """
         self.recent_wifis = []
+        self.runner = runner or subprocess.check_output
+        self.scan_ttl = scan_ttl
+        self._scan_cache = None
+        self._scan_time = 0.0
+        self._cache_lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._refresh_stop = threading.Event()
+        self._refresh_thread = None
         self.ensure_config_dir()
+        if background_refresh:
+            self.start_background_refresh()
     
     # 确保配置目录存在
     def ensure_config_dir(self):
@@ -36,165 +56,155 @@ class WiFiTool:
 
     # 解码混合编码的输出（Windows中文支持）
     def decode_mixed_encoding(self, byte_data):
-        decoded = byte_data.decode('gbk', errors='replace')
-        
-        # 修正SSID部分
-        ssid_pattern = re.compile(r'(SSID \d+ : )(.+)')
-        
-        def fix_ssid(match):
-            prefix = match.group(1)
-            ssid_bytes = match.group(2).encode('gbk', errors='replace')
-            try:
-                fixed_ssid = ssid_bytes.decode('utf-8')
-            except:
-                fixed_ssid = match.group(2)
-            return prefix + fixed_ssid
-        
-        return ssid_pattern.sub(fix_ssid, decoded)
+        return wifi_parser.decode_mixed_encoding(byte_data)
 
     # 功能1：扫描WiFi网络
-    def scan_wifi_networks(self):
-        """扫描附近的WiFi网络"""
+    def scan_wifi_networks(self, verbose=True):
+        """扫描附近的WiFi网络，扫描失败时返回 None
+
+        verbose 为 False 时不输出提示（供后台刷新使用）。
+        """
+        log = print if verbose else (lambda *args, **kwargs: None)
         try:
-            print("正在扫描WiFi网络...")
+            log("正在扫描WiFi网络...")
             networks = []
             
             if IS_WINDOWS:
                 # Windows环境
-                raw_output = subprocess.check_output(
+                raw_output = self.runner(
                     ("netsh", "wlan", "show", "network", "mode=Bssid"),
                     timeout=10
                 )
                 output = self.decode_mixed_encoding(raw_output)
-                
-                # 解析WiFi网络信息
-                ssid_pattern = re.compile(r'SSID (\d+) : (.+)')
-                signal_pattern = re.compile(r'信号\s*:\s*(\d+)%')
-                auth_pattern = re.compile(r'身份验证\s*:\s*(.+)')
-                encryption_pattern = re.compile(r'加密\s*:\s*(.+)')
-                
-                current_network = None
-                
-                for line in output.split('\n'):
-                    line = line.strip()
-                    
-                    ssid_match = ssid_pattern.match(line)
-                    if ssid_match:
-                        if current_network:
-                            networks.append(current_network)
-                        current_network = {
-                            "ssid": ssid_match.group(2).strip('"'),
-                            "signal": 0,
-                            "authentication": "",
-                            "encryption": ""
-                        }
-                    
-                    if current_network:
-                        signal_match = signal_pattern.match(line)
-                        if signal_match:
-                            current_network["signal"] = int(signal_match.group(1))
-                        
-                        auth_match = auth_pattern.match(line)
-                        if auth_match:
-                            current_network["authentication"] = auth_match.group(1)
-                        
-                        encryption_match = encryption_pattern.match(line)
-                        if encryption_match:
-                            current_network["encryption"] = encryption_match.group(1)
-                
-                if current_network:
-                    networks.append(current_network)
+                networks = wifi_parser.parse_netsh(output)
             
             elif IS_LINUX:
                 # Linux环境
                 try:
                     # 获取WiFi接口
-                    interfaces_output = subprocess.check_output(
+                    interfaces_output = self.runner(
                         ["iw", "dev"],
                         timeout=5
                     ).decode('utf-8')
-                    
-                    wifi_interfaces = []
-                    for line in interfaces_output.split('\n'):
-                        match = re.search(r'Interface\s+(\w+)', line)
-                        if match:
-                            wifi_interfaces.append(match.group(1))
+                    wifi_interfaces = wifi_parser.parse_iw_dev(interfaces_output)
                     
                     if not wifi_interfaces:
-                        print("未找到WiFi接口")
-                        return []
+                        log("未找到WiFi接口")
+                        return None
                     
                     # 使用第一个WiFi接口进行扫描
                     interface = wifi_interfaces[0]
-                    print(f"使用WiFi接口: {interface}")
+                    log(f"使用WiFi接口: {interface}")
                     
                     # 执行扫描
-                    scan_output = subprocess.check_output(
+                    scan_output = self.runner(
                         ["iwlist", interface, "scan"],
                         timeout=10
                     ).decode('utf-8', errors='replace')
-                    
-                    # 解析扫描结果
-                    network_blocks = re.split(r'Cell\s+\d+', scan_output)
-                    
-                    for block in network_blocks[1:]:  # 跳过第一个空块
-                        network = {}
-                        
-                        # 提取ESSID (SSID)
-                        essid_match = re.search(r'ESSID:"([^"]*)"', block)
-                        if essid_match:
-                            network["ssid"] = essid_match.group(1)
-                        else:
-                            continue
-                        
-                        # 提取信号强度
-                        signal_match = re.search(r'Signal level=(-?\d+)', block)
-                        if signal_match:
-                            # 将dBm转换为百分比（近似值）
-                            dbm = int(signal_match.group(1))
-                            network["signal"] = min(100, max(0, int((dbm + 90) * (100 / 60))))
-                        else:
-                            network["signal"] = 0
-                        
-                        # 提取加密信息
-                        if 'Encryption key:on' in block:
-                            if 'WPA' in block:
-                                network["authentication"] = "WPA/WPA2"
-                                network["encryption"] = "CCMP/AES"
-                            elif 'WEP' in block:
-                                network["authentication"] = "WEP"
-                                network["encryption"] = "WEP"
-                            else:
-                                network["authentication"] = "Unknown"
-                                network["encryption"] = "Unknown"
-                        else:
-                            network["authentication"] = "Open"
-                            network["encryption"] = "None"
-                        
-                        networks.append(network)
+                    networks = wifi_parser.parse_iwlist(scan_output)
                         
                 except subprocess.CalledProcessError as e:
-                    print(f"Linux WiFi扫描命令失败，可能需要sudo权限: {e}")
+                    log(f"Linux WiFi扫描命令失败，可能需要sudo权限: {e}")
+                    return None
             
             # 去重并按信号强度排序
-            unique_networks = {}
-            for network in networks:
-                ssid = network["ssid"]
-                if ssid not in unique_networks or network["signal"] > unique_networks[ssid]["signal"]:
-                    unique_networks[ssid] = network
-            
-            sorted_networks = sorted(unique_networks.values(), key=lambda x: x["signal"], reverse=True)
-            return sorted_networks
+            return wifi_parser.dedupe_networks(networks)
         
         except subprocess.CalledProcessError as e:
-            print(f"扫描WiFi网络失败: {e}")
-            return []
+            log(f"扫描WiFi网络失败: {e}")
+            return None
         except subprocess.TimeoutExpired:
-            print("扫描WiFi网络超时")
-            return []
+            log("扫描WiFi网络超时")
+            return None
         except Exception as e:
-            print(f"扫描WiFi网络时发生未知错误: {e}")
-            return []
+            log(f"扫描WiFi网络时发生未知错误: {e}")
+            return None
+
+    # 带缓存的WiFi扫描
+    def get_wifi_networks(self, force_refresh=False, verbose=True):
+        """返回WiFi网络列表，缓存未过期时直接返回上次扫描结果
+
+        同一时刻只运行一次扫描：若后台刷新线程正在扫描，缓存已过期时直接返回旧结果而不等待；
+        其他情况下调用方等待正在进行的扫描完成后直接使用新结果。
+        扫描失败时返回空列表且不写入缓存，下次获取时会重新扫描。
+        """
+        stale = None
+        if not force_refresh:
+            cached = self._cached_networks()
+            if cached is not None:
+                return cached
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                with self._cache_lock:
+                    stale = self._scan_cache and list(self._scan_cache)
+
+        requested_at = time.monotonic()
+        # 有旧结果可用时不等待后台扫描
+        if not self._scan_lock.acquire(blocking=stale is None):
+            return stale
+        try:
+            # 等待期间其他线程可能已完成扫描
+            with self._cache_lock:
+                if self._scan_cache is not None and self._scan_time >= requested_at:
+                    return list(self._scan_cache)
+            networks = self.scan_wifi_networks(verbose=verbose)
+            if networks is None:
+                return []
+            with self._cache_lock:
+                self._scan_cache = networks
+                self._scan_time = time.monotonic()
+        finally:
+            self._scan_lock.release()
+        return list(networks)
+
+    def _cached_networks(self):
+        """未过期的缓存结果，没有或已过期时返回 None"""
+        with self._cache_lock:
+            if self._scan_cache is None or self.scan_age() > self.scan_ttl:
+                return None
+            return list(self._scan_cache)
+
+    def scan_age(self):
+        """上次扫描距今的秒数，从未扫描时返回 None"""
+        if self._scan_cache is None:
+            return None
+        return time.monotonic() - self._scan_time
+
+    def invalidate_scan_cache(self):
+        """清空扫描缓存，下次获取时重新扫描"""
+        with self._cache_lock:
+            self._scan_cache = None
+            self._scan_time = 0.0
+
+    # 后台刷新扫描结果
+    def start_background_refresh(self):
+        """启动后台线程，在缓存过期前刷新扫描缓存"""
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        self._refresh_stop.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="wifi-scan-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def stop_background_refresh(self, timeout=None):
+        """停止后台刷新线程"""
+        self._refresh_stop.set()
+        if self._refresh_thread:
+            self._refresh_thread.join(timeout)
+            self._refresh_thread = None
+
+    def _refresh_loop(self):
+        # 按上次扫描耗时提前开始下一次扫描，使其在缓存过期前完成
+        while not self._refresh_stop.is_set():
+            started = time.monotonic()
+            self.get_wifi_networks(force_refresh=True, verbose=False)
+            elapsed = time.monotonic() - started
+            self._refresh_stop.wait(max(1, self.scan_ttl - 2 * elapsed))
+
+    def _describe_scan_age(self):
+        """上次扫描时间的提示文字"""
+        age = self.scan_age()
+        if age is None or age < 1:
+            return ""
+        return f"（{int(age)} 秒前的扫描结果，输入 '0' 可重新扫描）"
 
     # 显示WiFi网络列表
     def display_wifi_networks(self, networks):
@@ -357,17 +367,13 @@ class WiFiTool:
             # 尝试使用wpa_supplicant连接（需要sudo权限）
             try:
                 # 获取WiFi接口
-                interfaces_output = subprocess.check_output(["iw", "dev"], stderr=subprocess.DEVNULL).decode('utf-8')
-                wifi_interface = None
-                for line in interfaces_output.split('\n'):
-                    match = re.search(r'Interface\s+(\w+)', line)
-                    if match:
-                        wifi_interface = match.group(1)
-                        break
+                interfaces_output = self.runner(["iw", "dev"], stderr=subprocess.DEVNULL).decode('utf-8')
+                wifi_interfaces = wifi_parser.parse_iw_dev(interfaces_output)
+                wifi_interface = wifi_interfaces[0] if wifi_interfaces else None
                 
                 if not wifi_interface:
                     # 尝试使用iwconfig查找WiFi接口
-                    iwconfig_output = subprocess.check_output(["iwconfig"], stderr=subprocess.DEVNULL).decode('utf-8')
+                    iwconfig_output = self.runner(["iwconfig"], stderr=subprocess.DEVNULL).decode('utf-8')
                     for line in iwconfig_output.split('\n'):
                         if 'IEEE' in line and 'ESSID' in line:
                             wifi_interface = line.split()[0]
@@ -503,8 +509,8 @@ class WiFiTool:
         """选择WiFi网络"""
         # 如果没有最近的WiFi列表，则自动扫描
         if not self.recent_wifis:
-            print("\n正在扫描WiFi网络...")
-            wifis = self.scan_wifi_networks()
+            print("\n正在获取WiFi网络列表...")
+            wifis = self.get_wifi_networks()
             # 更新全局变量
             self.recent_wifis = wifis
             if wifis:
@@ -514,7 +520,7 @@ class WiFiTool:
                 print("未发现任何WiFi网络")
         
         if self.recent_wifis:
-            print("\n📡 可用的WiFi网络:")
+            print(f"\n📡 可用的WiFi网络:{self._describe_scan_age()}")
             self.display_wifi_networks(self.recent_wifis)
             print("💡 提示：输入WiFi编号或直接输入SSID名称")
             print("💡 输入 '0' 可重新扫描WiFi网络")
@@ -525,7 +531,7 @@ class WiFiTool:
                 # 检查是否需要重新扫描
                 if user_input == '0':
                     print("\n正在重新扫描WiFi网络...")
-                    wifis = self.scan_wifi_networks()
+                    wifis = self.get_wifi_networks(force_refresh=True)
                     # 更新全局变量
                     self.recent_wifis = wifis
                     if wifis:
@@ -599,11 +605,11 @@ class WiFiTool:
     def handle_scan_wifi(self):
         """处理WiFi扫描功能"""
         print("\n正在搜索WiFi网络...")
-        wifis = self.scan_wifi_networks()
+        wifis = self.get_wifi_networks()
         # 更新全局变量
         self.recent_wifis = wifis
         if wifis:
-            print("\n📡 已发现WiFi网络:")
+            print(f"\n📡 已发现WiFi网络:{self._describe_scan_age()}")
             print("-" * 60)
             for i, wifi in enumerate(wifis, 1):
                 print(f"{i:2d}. SSID: {wifi['ssid'][:30]:<30} 信号: {wifi['signal']:3d}% 加密: {wifi['encryption']}")
@@ -656,8 +662,18 @@ class WiFiTool:
 # 主函数
 def main():
     """主函数 - 启动WiFi连接工具"""
-    wifi_tool = WiFiTool()
-    wifi_tool.run_menu()
+    parser = argparse.ArgumentParser(description="WiFi快速连接工具")
+    parser.add_argument('--scan-ttl', type=float, default=DEFAULT_SCAN_TTL,
+                        help=f"扫描结果缓存有效期（秒），默认 {DEFAULT_SCAN_TTL}")
+    parser.add_argument('--background-refresh', action='store_true',
+                        help="在后台按缓存有效期周期刷新扫描结果")
+    args = parser.parse_args()
+
+    wifi_tool = WiFiTool(scan_ttl=args.scan_ttl, background_refresh=args.background_refresh)
+    try:
+        wifi_tool.run_menu()
+    finally:
+        wifi_tool.stop_background_refresh(timeout=1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file